@@ -0,0 +1,180 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import librosa
+import soundfile as sf
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from components.preprocessing import IN_PLACE, TRANSFORMS
+from utils.catalog import discover_audio_files
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def parse_step(step: str):
+    """
+    "lowpass:N=4,cutoff=500" -> {"name": "lowpass", "params": {...}}.
+    Values are parsed as JSON when possible and kept as strings otherwise.
+    """
+    name, _, args = step.partition(":")
+    params = {}
+    for arg in filter(None, args.split(",")):
+        key, _, value = arg.partition("=")
+        try:
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    if name not in TRANSFORMS:
+        raise ValueError(f"unknown transform {name!r}, choose from "
+                         f"{sorted(TRANSFORMS)}")
+    return {"name": name, "params": params}
+
+
+def load_pipeline(args):
+    if args.pipeline_file is not None:
+        with open(args.pipeline_file) as f:
+            pipeline = json.load(f)
+        for step in pipeline:
+            if step["name"] not in TRANSFORMS:
+                raise ValueError(f"unknown transform {step['name']!r}")
+            step.setdefault("params", {})
+        return pipeline
+    return [parse_step(step) for step in args.pipeline]
+
+
+def pipeline_digest(pipeline: list, sr) -> str:
+    spec = json.dumps({"pipeline": pipeline, "sr": sr}, sort_keys=True)
+    return hashlib.sha1(spec.encode()).hexdigest()
+
+
+def read_manifest(path: Path):
+    done = {}
+    if path.exists():
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # partially written line of an interrupted run
+                    continue
+                done[entry["input"]] = entry
+    return done
+
+
+def process_file(input_path: str, output_path: str, pipeline: list, sr):
+    start = time.perf_counter()
+    y, sr = librosa.load(input_path, sr=sr, mono=True, res_type="kaiser_fast")
+    for step in pipeline:
+        params = dict(step["params"])
+        if step["name"] in IN_PLACE:
+            # the decoded signal belongs to this loop, so overwrite it
+            params["out"] = y
+        y = TRANSFORMS[step["name"]](y, sr, **params)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    sf.write(tmp_path, y, sr, format=Path(output_path).suffix[1:].upper())
+    os.replace(tmp_path, output_path)
+    return len(y) / sr, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Apply the preprocessing transforms of the app to every "
+        "audio file under a folder.")
+    parser.add_argument("input_dir", type=Path)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument(
+        "--pipeline",
+        nargs="+",
+        default=[],
+        help="steps such as normalize 'lowpass:N=4,cutoff=500'")
+    parser.add_argument(
+        "--pipeline-file",
+        type=Path,
+        help='JSON list of {"name": ..., "params": {...}} steps')
+    parser.add_argument(
+        "--sr", type=int, default=None, help="resample to this rate")
+    parser.add_argument(
+        "--format", choices=["wav", "flac"], default="wav")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    pipeline = load_pipeline(args)
+    if not pipeline:
+        parser.error("give --pipeline or --pipeline-file")
+    digest = pipeline_digest(pipeline, args.sr)
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = args.output_dir / MANIFEST_NAME
+    done = read_manifest(manifest_path)
+
+    jobs = []
+    sources = {}  # output -> input, to catch e.g. x.wav and x.mp3
+    collisions = []
+    for path in discover_audio_files(args.input_dir):
+        rel = str(path.relative_to(args.input_dir))
+        stat = path.stat()
+        output = args.output_dir / Path(rel).with_suffix(f".{args.format}")
+        if output in sources:
+            collisions.append(f"{sources[output]} and {rel} -> {output}")
+            continue
+        sources[output] = rel
+        entry = done.get(rel)
+        if (entry is not None and entry["pipeline"] == digest
+                and entry["mtime_ns"] == stat.st_mtime_ns
+                and entry["size"] == stat.st_size and output.exists()):
+            continue
+        jobs.append((path, rel, output, stat))
+    if collisions:
+        parser.error("inputs that only differ in their extension would "
+                     "overwrite each other:\n" + "\n".join(collisions))
+    print(f"{len(jobs)} files to process, {len(done)} in manifest",
+          file=sys.stderr)
+
+    total_audio = 0.0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor, \
+            open(manifest_path, "a") as manifest:
+        futures = {
+            executor.submit(process_file, str(path), str(output), pipeline,
+                            args.sr): (rel, output, stat)
+            for path, rel, output, stat in jobs
+        }
+        for future in as_completed(futures):
+            rel, output, stat = futures[future]
+            try:
+                audio_seconds, seconds = future.result()
+            except Exception as e:
+                print(f"FAILED {rel}: {e!r}", file=sys.stderr)
+                continue
+            total_audio += audio_seconds
+            manifest.write(
+                json.dumps({
+                    "input": rel,
+                    "output": str(output.relative_to(args.output_dir)),
+                    "pipeline": digest,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "audio_seconds": audio_seconds,
+                    "seconds": seconds,
+                }) + "\n")
+            manifest.flush()
+            print(f"{rel}: {audio_seconds:.1f} s audio in {seconds:.2f} s "
+                  f"({audio_seconds / max(seconds, 1e-9):.1f}x realtime)",
+                  file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    print(f"processed {total_audio:.1f} s of audio in {elapsed:.1f} s "
+          f"({total_audio / max(elapsed, 1e-9):.1f}x realtime)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compare the shared-STFT pitch/stretch chain against running librosa's
+pitch_shift and time_stretch one after the other.
+
+    python benchmarks/bench_spectral_chain.py --seconds 30 --sr 32000
+"""
+import argparse
+import sys
+import time
+
+import librosa
+import numpy as np
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from components.spectral import pitch_time_shift, resample_pitch_shift  # noqa: E402
+
+
+def best_of(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--sr", type=int, default=32000)
+    parser.add_argument("--n-steps", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=0.9)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    y = rng.standard_normal(int(args.seconds * args.sr), dtype=np.float32)
+
+    def per_transform():
+        shifted = librosa.effects.pitch_shift(y, args.sr, args.n_steps)
+        return librosa.effects.time_stretch(shifted, args.rate)
+
+    def chain():
+        return pitch_time_shift(
+            y, args.sr, rate=args.rate, n_steps=args.n_steps)
+
+    def fast():
+        return resample_pitch_shift(y, args.n_steps)
+
+    baseline = best_of(per_transform, args.repeat)
+    print(f"pitch_shift + time_stretch: {baseline:.3f} s")
+    for name, fn in [("shared STFT chain", chain),
+                     ("resample pitch shift", fast)]:
+        seconds = best_of(fn, args.repeat)
+        print(f"{name}: {seconds:.3f} s ({baseline / seconds:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Compare the frame-batched iterative Wiener denoiser against
+pyroomacoustics.denoise.apply_iterative_wiener, and check that both agree.
+
+    python benchmarks/bench_wiener.py --seconds 60 --sr 32000
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pyroomacoustics as pra
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from components.wiener import iterative_wiener  # noqa: E402
+
+
+def best_of(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def noisy_tone(seconds: float, sr: int, rng: np.random.Generator):
+    t = np.arange(int(seconds * sr)) / sr
+    # a tone switched on and off every second, so that both speech-like and
+    # noise-only frames are present
+    tone = 0.5 * np.sin(2 * np.pi * 440 * t) * (np.floor(t) % 2)
+    noise = 0.05 * rng.standard_normal(len(t))
+    return (tone + noise).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--sr", type=int, default=32000)
+    parser.add_argument("--frame-len", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--rtol", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    y = noisy_tone(args.seconds, args.sr, np.random.default_rng(0))
+
+    baseline, expected = best_of(
+        lambda: pra.denoise.apply_iterative_wiener(
+            y.astype(np.float64), frame_len=args.frame_len), args.repeat)
+    print(f"pyroomacoustics: {baseline:.3f} s")
+    for name, workers in [("batched, 1 worker", 1),
+                          ("batched, process pool", args.workers)]:
+        seconds, actual = best_of(
+            lambda: iterative_wiener(
+                y, frame_len=args.frame_len, workers=workers), args.repeat)
+        error = np.abs(actual - expected).max() / np.abs(expected).max()
+        print(f"{name}: {seconds:.3f} s ({baseline / seconds:.2f}x), "
+              f"max relative error {error:.2e}")
+        if error > args.rtol:
+            sys.exit(f"{name} differs from pyroomacoustics by {error:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from conftest import run, unwrap
+
+from components.augmentation import (NoiseInjection, PitchShift, RandomVolume,
+                                     TimeStretch, apply)
+
+TRANSFORMS = {
+    "noise": lambda sr: NoiseInjection(always_apply=True, sr=sr),
+    "pitch_shift": lambda sr: PitchShift(always_apply=True, sr=sr),
+    "pitch_shift_resample":
+    lambda sr: PitchShift(always_apply=True, sr=sr, mode="resample"),
+    "time_stretch": lambda sr: TimeStretch(always_apply=True, sr=sr),
+    "volume": lambda sr: RandomVolume(always_apply=True),
+}
+
+
+@pytest.mark.parametrize("name", sorted(TRANSFORMS))
+def bench_transform(benchmark, signal, sr, name):
+    transform = TRANSFORMS[name](sr)
+    # the same draw every round, so that rounds do the same work
+    run(benchmark, lambda: transform(signal, rng=np.random.default_rng(0)))
+
+
+def bench_compose(benchmark, signal, sr):
+    compose = [TRANSFORMS[name](sr) for name in sorted(TRANSFORMS)]
+    run(benchmark, unwrap(apply), signal, compose, 0)
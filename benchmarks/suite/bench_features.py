@@ -0,0 +1,36 @@
+import pytest
+
+from conftest import run
+
+from components import envelope, features
+from components.features import melspectrogram, spectrogram
+
+PARAMS = {"n_fft": 1024, "hop_length": 320}
+
+
+def _clear():
+    features._tiles.clear()
+    features._stages.clear()
+
+
+@pytest.mark.parametrize("log", [True, False])
+def bench_melspectrogram(benchmark, signal, sr, log):
+    params = dict(PARAMS, n_mels=64, fmin=20, fmax=sr // 2, sr=sr)
+    run(benchmark, melspectrogram, signal, params, log, setup=_clear)
+
+
+@pytest.mark.parametrize("log", [True, False])
+def bench_spectrogram(benchmark, signal, log):
+    run(benchmark, spectrogram, signal, PARAMS, log, setup=_clear)
+
+
+def bench_spectrogram_window(benchmark, signal, sr):
+    # a 30 s window in the middle, as the plot settings would ask for
+    start = max(len(signal) // 2 - 15 * sr, 0)
+    window = (start, min(start + 30 * sr, len(signal)))
+    run(benchmark, spectrogram, signal, PARAMS, True, window, setup=_clear)
+
+
+def bench_envelope_pyramid(benchmark, signal):
+    run(benchmark, envelope.envelope_pyramid, signal,
+        setup=envelope._pyramids.clear)
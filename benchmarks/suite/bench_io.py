@@ -0,0 +1,47 @@
+import pytest
+
+from conftest import run, unwrap
+
+import utils
+
+from utils.cache import decode_cache
+from utils.io import read_native_audio
+from utils.probe import probe_audio_info
+from utils.resample import RESAMPLING_QUALITIES, resample
+
+read_native_audio = unwrap(read_native_audio)
+read_audio_range = unwrap(utils.read_audio_range)
+check_audio_info = unwrap(utils.check_audio_info)
+
+
+def bench_decode_cold(benchmark, audio_file):
+    info = probe_audio_info(audio_file)
+    run(benchmark, read_native_audio, audio_file, info,
+        setup=decode_cache.clear)
+
+
+def bench_decode_cached(benchmark, audio_file):
+    info = probe_audio_info(audio_file)
+    read_native_audio(audio_file, info)
+    run(benchmark, read_native_audio, audio_file, info)
+
+
+def bench_read_range(benchmark, audio_file):
+    info = probe_audio_info(audio_file)
+    start = info["duration"] / 2
+    run(benchmark, read_audio_range, audio_file, info, start, start + 5.0,
+        setup=decode_cache.clear)
+
+
+@pytest.mark.parametrize("quality", RESAMPLING_QUALITIES)
+def bench_resample(benchmark, signal, sr, quality):
+    run(benchmark, resample, signal, sr, 22050, quality)
+
+
+def bench_probe(benchmark, audio_file):
+    run(benchmark, probe_audio_info, audio_file)
+
+
+def bench_check_audio_info(benchmark, audio_file):
+    # after the first call this is an audio info database lookup
+    run(benchmark, check_audio_info, audio_file)
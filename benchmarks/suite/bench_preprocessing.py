@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+from conftest import run
+
+from components.preprocessing import butterworth_filter
+from components.wiener import iterative_wiener
+
+# the pyroomacoustics-equivalent denoiser is the slowest path by far
+MAX_WIENER_SECONDS = float(os.environ.get("BENCH_MAX_WIENER_SECONDS", 600))
+
+
+@pytest.mark.parametrize("btype, cutoff", [("lowpass", 500.),
+                                           ("highpass", 1000.),
+                                           ("bandpass", (20., 4000.))])
+def bench_butterworth_filter(benchmark, signal, sr, btype, cutoff):
+    run(benchmark, butterworth_filter, signal, sr, 4, cutoff, btype)
+
+
+@pytest.mark.parametrize("workers", [1, None])
+def bench_iterative_wiener(benchmark, signal, sr, workers):
+    if len(signal) / sr > MAX_WIENER_SECONDS:
+        pytest.skip("longer than BENCH_MAX_WIENER_SECONDS")
+    run(benchmark, iterative_wiener, signal, workers=workers, rounds=1)
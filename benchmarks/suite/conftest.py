@@ -0,0 +1,129 @@
+"""
+Fixtures of the hot-path benchmark suite.
+
+Synthetic audio is generated once per session. Fixture sizes are chosen
+with environment variables so that the default run stays short:
+
+    BENCH_DURATIONS     comma separated, from 10s, 10m and 1h (default 10s)
+    BENCH_SAMPLE_RATES  comma separated rates in Hz (default 16000,32000)
+
+Caches of the app (the decode cache, the audio info database) are kept in
+a temporary directory, and Streamlit's st.cache is bypassed by calling the
+undecorated functions.
+"""
+import inspect
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from pathlib import Path
+
+os.environ.setdefault("STREAMLIT_AUDIO_CACHE_DIR",
+                      tempfile.mkdtemp(prefix="streamlit-audio-bench-"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+DURATIONS = {"10s": 10, "10m": 600, "1h": 3600}
+
+
+def _env_list(name: str, default: str):
+    return [value.strip() for value in os.environ.get(name, default).split(",")]
+
+
+def durations():
+    return _env_list("BENCH_DURATIONS", "10s")
+
+
+def sample_rates():
+    return [int(sr) for sr in _env_list("BENCH_SAMPLE_RATES", "16000,32000")]
+
+
+def synthetic_signal(seconds: float, sr: int, seed: int = 0) -> np.ndarray:
+    # chirp plus noise: broadband enough for filters and features to do
+    # real work, and deterministic so that runs are comparable
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr), dtype=np.float32) / sr
+    phase = 2 * np.pi * (200 * t + (sr / 8 - 200) / (2 * seconds) * t**2)
+    y = 0.5 * np.sin(phase) + 0.05 * rng.standard_normal(len(t), np.float32)
+    return y.astype(np.float32)
+
+
+def unwrap(fn):
+    """The function under an st.cache decorator."""
+    return inspect.unwrap(fn)
+
+
+def run(benchmark, fn, *args, setup=None, rounds=3, **kwargs):
+    """
+    Time ``fn(*args, **kwargs)`` with pytest-benchmark, then run it once more
+    under tracemalloc and store the peak in the benchmark's extra_info.
+    ``setup`` is called before every call, untimed.
+    """
+    def pedantic_setup():
+        if setup is not None:
+            setup()
+
+    result = benchmark.pedantic(
+        fn,
+        args=args,
+        kwargs=kwargs,
+        setup=pedantic_setup,
+        rounds=rounds,
+        iterations=1)
+
+    pedantic_setup()
+    tracemalloc.start()
+    try:
+        fn(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    benchmark.extra_info["peak_bytes"] = peak
+    return result
+
+
+def pytest_generate_tests(metafunc):
+    if "duration" in metafunc.fixturenames:
+        metafunc.parametrize("duration", durations(), scope="session")
+    if "sr" in metafunc.fixturenames:
+        metafunc.parametrize("sr", sample_rates(), scope="session")
+    if "audio_format" in metafunc.fixturenames:
+        metafunc.parametrize(
+            "audio_format", ["wav", "flac", "mp3"], scope="session")
+
+
+@pytest.fixture(scope="session")
+def fixture_dir(tmp_path_factory):
+    return tmp_path_factory.mktemp("audio")
+
+
+@pytest.fixture(scope="session")
+def signal(duration, sr):
+    return synthetic_signal(DURATIONS[duration], sr)
+
+
+@pytest.fixture(scope="session")
+def audio_file(fixture_dir, signal, duration, sr, audio_format):
+    path = fixture_dir / f"{duration}_{sr}.{audio_format}"
+    if path.exists():
+        return path
+    if audio_format == "mp3":
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            pytest.skip("ffmpeg is needed to encode the mp3 fixtures")
+        wav_path = fixture_dir / f"{duration}_{sr}.mp3.wav"
+        sf.write(str(wav_path), signal, sr, subtype="PCM_16")
+        subprocess.run(
+            [ffmpeg, "-loglevel", "error", "-y", "-i", str(wav_path),
+             str(path)],
+            check=True)
+        wav_path.unlink()
+    else:
+        sf.write(str(path), signal, sr, subtype="PCM_16")
+    return path
@@ -1,4 +1,5 @@
 from .augmentation import augmentations_on_wave
 from .base import *
+from .envelope import prefetch_envelopes
 from .plots import waveplot, specshow, waveplot_with_annotation, specshow_with_annotation
 from .preprocessing import preprocess_on_wave
@@ -2,47 +2,122 @@ import librosa
 import numpy as np
 import streamlit as st
 
+from typing import Optional
+
+from utils import instrument
+from utils.signal import HASH_FUNCS, Signal, as_float32, derive, fingerprint
+from .spectral import pitch_time_shift, resample_pitch_shift
+
+
+def _rng(rng: Optional[np.random.Generator]) -> np.random.Generator:
+    return np.random.default_rng() if rng is None else rng
+
 
 class AudioTransform:
+    # whether apply(..., inplace=True) writes into ``y`` instead of
+    # allocating its output
+    supports_inplace = False
+
     def __init__(self, always_apply=False, p=0.5):
         self.always_apply = always_apply
         self.p = p
 
-    def __call__(self, y: np.ndarray):
+    def __call__(self, y: np.ndarray, rng: Optional[np.random.Generator] = None,
+                 inplace=False):
+        rng = _rng(rng)
         if self.always_apply:
-            return self.apply(y)
+            return self.apply(y, rng=rng, inplace=inplace)
         else:
-            if np.random.rand() < self.p:
-                return self.apply(y)
+            if rng.random() < self.p:
+                return self.apply(y, rng=rng, inplace=inplace)
             else:
                 return y
 
-    def apply(self, y: np.ndarray):
+    def batch(self, y: np.ndarray, rng: Optional[np.random.Generator] = None):
+        """
+        Apply to every row of a (batch, time) array, gating each row
+        independently with ``p`` / ``always_apply``.
+        """
+        rng = _rng(rng)
+        if self.always_apply:
+            mask = np.ones(len(y), dtype=bool)
+        else:
+            mask = rng.random(len(y)) < self.p
+        return self.apply_batch(y, mask, rng)
+
+    def apply(self, y: np.ndarray, rng: Optional[np.random.Generator] = None, **params):
         raise NotImplementedError
 
+    def apply_batch(self, y: np.ndarray, mask: np.ndarray, rng: np.random.Generator):
+        # row by row fallback for transforms without a vectorized version
+        augmented = y.copy()
+        for i in np.flatnonzero(mask):
+            row = self.apply(y[i], rng=rng)
+            if len(row) != y.shape[1]:
+                raise ValueError(
+                    f"{type(self).__name__} changes the signal length and "
+                    "can't be applied to a batch")
+            augmented[i] = row
+        return augmented
+
 
 class NoiseInjection(AudioTransform):
+    supports_inplace = True
+    # noise is drawn block by block instead of as one full-length vector
+    BLOCK_SIZE = 1 << 16
+
     def __init__(self, always_apply=False, p=0.5, max_noise_level=0.5, sr=32000):
         super().__init__(always_apply, p)
 
         self.noise_level = (0.0, max_noise_level)
         self.sr = sr
 
-    def apply(self, y: np.ndarray, **params):
-        noise_level = np.random.uniform(*self.noise_level)
-        noise = np.random.randn(len(y))
-        augmented = (y + noise * noise_level).astype(y.dtype)
+    def apply(self, y: np.ndarray, rng: Optional[np.random.Generator] = None, **params):
+        rng = _rng(rng)
+        noise_level = np.float32(rng.uniform(*self.noise_level))
+        if params.get("inplace"):
+            augmented = y
+        else:
+            augmented = np.array(y, dtype=np.float32)
+        scratch = np.empty(min(self.BLOCK_SIZE, len(y)), dtype=np.float32)
+        for start in range(0, len(y), self.BLOCK_SIZE):
+            block = augmented[start:start + self.BLOCK_SIZE]
+            noise = scratch[:len(block)]
+            rng.standard_normal(dtype=np.float32, out=noise)
+            noise *= noise_level
+            block += noise
+        return augmented
+
+    def apply_batch(self, y: np.ndarray, mask: np.ndarray, rng: np.random.Generator):
+        rows = np.flatnonzero(mask)
+        noise_level = rng.uniform(*self.noise_level, size=(len(rows), 1))
+        noise = rng.standard_normal((len(rows), y.shape[1]), dtype=np.float32)
+        noise *= noise_level.astype(np.float32)
+        augmented = y.copy()
+        augmented[rows] += noise
         return augmented
 
 
 class PitchShift(AudioTransform):
-    def __init__(self, always_apply=False, p=0.5, max_range=5, sr=32000):
+    """
+    ``mode="phase_vocoder"`` keeps the duration (librosa's pitch_shift),
+    ``mode="resample"`` is a much cheaper polyphase resampling that shifts
+    the tempo along with the pitch, meant for training-time use.
+    """
+    def __init__(self, always_apply=False, p=0.5, max_range=5, sr=32000,
+                 mode="phase_vocoder"):
         super().__init__(always_apply, p)
         self.max_range = max_range
         self.sr = sr
+        self.mode = mode
 
-    def apply(self, y: np.ndarray, **params):
-        n_steps = np.random.randint(-self.max_range, self.max_range)
+    def sample_n_steps(self, rng: np.random.Generator):
+        return rng.integers(-self.max_range, self.max_range)
+
+    def apply(self, y: np.ndarray, rng: Optional[np.random.Generator] = None, **params):
+        n_steps = self.sample_n_steps(_rng(rng))
+        if self.mode == "resample":
+            return resample_pitch_shift(y, n_steps)
         augmented = librosa.effects.pitch_shift(y, self.sr, n_steps)
         return augmented
 
@@ -53,12 +128,64 @@ class TimeStretch(AudioTransform):
         self.max_rate = max_rate
         self.sr = sr
 
-    def apply(self, y: np.ndarray, **params):
-        rate = np.random.uniform(0, self.max_rate)
+    def sample_rate(self, rng: np.random.Generator):
+        return rng.uniform(0, self.max_rate)
+
+    def apply(self, y: np.ndarray, rng: Optional[np.random.Generator] = None, **params):
+        rate = self.sample_rate(_rng(rng))
         augmented = librosa.effects.time_stretch(y, rate)
         return augmented
 
 
+class SpectralChain(AudioTransform):
+    """
+    Consecutive PitchShift / TimeStretch transforms run as one STFT ->
+    phase vocoder -> ISTFT round trip. Each member keeps its own ``p`` /
+    ``always_apply`` gate and parameter range.
+    """
+    def __init__(self, transforms: list, sr=32000):
+        super().__init__(always_apply=True)
+        self.transforms = transforms
+        self.sr = sr
+
+    def apply(self, y: np.ndarray, rng: Optional[np.random.Generator] = None, **params):
+        rng = _rng(rng)
+        rate = 1.0
+        n_steps = 0
+        for transform in self.transforms:
+            if transform.always_apply or rng.random() < transform.p:
+                if isinstance(transform, PitchShift):
+                    n_steps += transform.sample_n_steps(rng)
+                else:
+                    rate *= transform.sample_rate(rng)
+        if rate == 1.0 and n_steps == 0:
+            return y
+        return pitch_time_shift(y, self.sr, rate=rate, n_steps=n_steps)
+
+
+def fuse_spectral(compose: list):
+    """
+    Replace runs of phase-vocoder based transforms in ``compose`` with a
+    SpectralChain sharing one STFT.
+    """
+    fused = []  # type: ignore
+    run = []  # type: ignore
+    for transform in compose + [None]:
+        if (isinstance(transform, TimeStretch)
+                or (isinstance(transform, PitchShift)
+                    and transform.mode == "phase_vocoder")):
+            run.append(transform)
+            continue
+        if len(run) > 1:
+            fused.append(SpectralChain(run, sr=run[0].sr))
+        else:
+            fused.extend(run)
+        run = []
+        if transform is not None:
+            fused.append(transform)
+    return fused
+
+
 def _db2float(db: float, amplitude=True):
     if amplitude:
         return 10**(db / 20)
@@ -66,7 +193,7 @@ def _db2float(db: float, amplitude=True):
         return 10 ** (db / 10)
 
 
-def volume_down(y: np.ndarray, db: float):
+def volume_down(y: np.ndarray, db: float, out: Optional[np.ndarray] = None):
     """
     Low level API for decreasing the volume
     Parameters
@@ -75,16 +202,18 @@ def volume_down(y: np.ndarray, db: float):
         stereo / monaural input audio
     db: float
         how much decibel to decrease
+    out: numpy.ndarray, optional
+        array to write the result to, may be ``y`` itself
     Returns
     -------
     applied: numpy.ndarray
         audio with decreased volume
     """
-    applied = y * _db2float(-db)
+    applied = np.multiply(y, np.float32(_db2float(-db)), out=out)
     return applied
 
 
-def volume_up(y: np.ndarray, db: float):
+def volume_up(y: np.ndarray, db: float, out: Optional[np.ndarray] = None):
     """
     Low level API for increasing the volume
     Parameters
@@ -93,26 +222,38 @@ def volume_up(y: np.ndarray, db: float):
         stereo / monaural input audio
     db: float
         how much decibel to increase
+    out: numpy.ndarray, optional
+        array to write the result to, may be ``y`` itself
     Returns
     -------
     applied: numpy.ndarray
         audio with increased volume
     """
-    applied = y * _db2float(db)
+    applied = np.multiply(y, np.float32(_db2float(db)), out=out)
     return applied
 
 
 class RandomVolume(AudioTransform):
+    supports_inplace = True
+
     def __init__(self, always_apply=False, p=0.5, limit=10):
         super().__init__(always_apply, p)
         self.limit = limit
 
-    def apply(self, y: np.ndarray, **params):
-        db = np.random.uniform(-self.limit, self.limit)
+    def apply(self, y: np.ndarray, rng: Optional[np.random.Generator] = None, **params):
+        db = _rng(rng).uniform(-self.limit, self.limit)
+        out = y if params.get("inplace") else None
         if db >= 0:
-            return volume_up(y, db)
+            return volume_up(as_float32(y), db, out=out)
         else:
-            return volume_down(y, db)
+            return volume_down(as_float32(y), -db, out=out)
+
+    def apply_batch(self, y: np.ndarray, mask: np.ndarray, rng: np.random.Generator):
+        rows = np.flatnonzero(mask)
+        db = rng.uniform(-self.limit, self.limit, size=(len(rows), 1))
+        augmented = y.copy()
+        augmented[rows] *= _db2float(db).astype(augmented.dtype)
+        return augmented
 
 
 def augmentations_on_wave(y: np.ndarray, sr: int):
@@ -153,6 +294,8 @@ def augmentations_on_wave(y: np.ndarray, sr: int):
             max_value=10,
             value=5,
             step=1)
+        fast = st.sidebar.checkbox(
+            "fast (resample, changes tempo)", key="pitch_fast")
         always_apply = st.sidebar.checkbox(
             "always_apply", key="pitch_always_apply")
         p = st.sidebar.slider(
@@ -167,7 +310,8 @@ def augmentations_on_wave(y: np.ndarray, sr: int):
                 always_apply=always_apply,
                 p=p,
                 max_range=max_range,
-                sr=sr))
+                sr=sr,
+                mode="resample" if fast else "phase_vocoder"))
 
     if "stretch" in options:
         st.sidebar.markdown("Stretch")
@@ -219,9 +363,56 @@ def augmentations_on_wave(y: np.ndarray, sr: int):
     return apply(y, compose)
 
 
-@st.cache
-def apply(y: np.ndarray, compose: list):
-    y_processed = y.copy()
+def _transform_key(transform: AudioTransform):
+    params = []
+    for name, value in sorted(vars(transform).items()):
+        if isinstance(value, list):
+            value = [_transform_key(v) for v in value]
+        params.append((name, value))
+    return type(transform).__name__, params
+
+
+# hash transforms by their parameters and keyed signals by their key
+_HASH_FUNCS = dict(HASH_FUNCS)
+_HASH_FUNCS.update({
+    cls: _transform_key
+    for cls in (NoiseInjection, PitchShift, TimeStretch, RandomVolume,
+                SpectralChain)
+})
+
+
+@instrument.timed("augment", cached=True)
+@st.cache(hash_funcs=_HASH_FUNCS)
+def apply(y: np.ndarray, compose: list, seed: Optional[int] = None):
+    instrument.mark_miss()
+    rng = np.random.default_rng(seed)
+    y_processed = y
+    for augmentor in fuse_spectral(compose):
+        # y is st.cache'd; only buffers produced here may be overwritten
+        owned = y_processed is not y
+        copies = None
+        if augmentor.supports_inplace:
+            copies = 0 if owned else 1
+        with instrument.copy_budget(y_processed, copies,
+                                    type(augmentor).__name__):
+            y_processed = augmentor(y=y_processed, rng=rng, inplace=owned)
+    y_processed = as_float32(y_processed)
+    if seed is None:
+        # an unseeded draw differs on every miss, so only its samples may
+        # key the features and envelopes cached for it
+        return Signal(y_processed, fingerprint(y_processed))
+    return derive(y, y_processed, "augment",
+                  [_transform_key(t) for t in compose], seed)
+
+
+def apply_batch(y: np.ndarray, compose: list, seed: Optional[int] = None):
+    """
+    Apply ``compose`` to a (batch, time) array. Every call draws from its own
+    ``np.random.Generator``, so a given seed reproduces the same batch and
+    concurrent calls don't share random state.
+    """
+    rng = np.random.default_rng(seed)
+    y_processed = np.asarray(y, dtype=np.float32)
     for augmentor in compose:
-        y_processed = augmentor(y=y_processed)
+        y_processed = augmentor.batch(y_processed, rng=rng)
     return y_processed
@@ -1,7 +1,13 @@
+import math
+
+import pandas as pd
 import streamlit as st
+import utils
 
 from pathlib import Path
 
+FILES_PER_PAGE = 1000
+
 
 def write_audio_info_to_sidebar(path: Path, info: dict):
     filename = path.name
@@ -12,6 +18,23 @@ def write_audio_info_to_sidebar(path: Path, info: dict):
         st.sidebar.text(f"{key}: {value}")
 
 
+def write_profile_to_sidebar(records: list):
+    if len(records) == 0 or not st.sidebar.checkbox("Show profile"):
+        return
+    st.sidebar.markdown("#### Profile")
+    profile = pd.DataFrame(records)
+    profile["MB"] = profile["bytes"] / 1024**2
+    # nested stages are indented under the stage they ran in
+    profile["stage"] = [
+        "  " * depth + stage
+        for depth, stage in zip(profile["depth"], profile["stage"])
+    ]
+    st.sidebar.dataframe(
+        profile[["stage", "cache", "seconds", "MB", "thread"]].round(3))
+    st.sidebar.text(
+        f"total {profile.loc[profile['depth'] == 0, 'seconds'].sum():.3f} s")
+
+
 def set_start_second(max_value: float):
     second = st.sidebar.slider(
         "start second", min_value=0, max_value=int(max_value), value=0, step=1)
@@ -24,3 +47,35 @@ def set_sampling_rate(current_value: int):
     sr = st.sidebar.selectbox(
         "Choose sampling rate", options=options, index=index)
     return sr
+
+
+def set_resampling_quality():
+    quality = st.sidebar.selectbox(
+        "Resampling quality", options=utils.RESAMPLING_QUALITIES, index=0)
+    return quality
+
+
+def select_audio_file(folder: Path):
+    n_files = utils.count_audio_files(folder)
+    prefix = ""
+    page = 1
+    if n_files > FILES_PER_PAGE:
+        prefix = st.text_input("Filter audio files by prefix")
+        n_matches = utils.count_audio_files(folder, prefix)
+        n_pages = max(math.ceil(n_matches / FILES_PER_PAGE), 1)
+        page = st.number_input(
+            f"Page (of {n_pages})",
+            min_value=1,
+            max_value=n_pages,
+            value=1,
+            step=1)
+
+    audio_files = utils.list_audio_files(
+        folder,
+        prefix=prefix,
+        limit=FILES_PER_PAGE,
+        offset=(page - 1) * FILES_PER_PAGE)
+    if len(audio_files) == 0:
+        st.warning("No audio file matches the prefix")
+        return None
+    return st.selectbox("Choose audio file", options=audio_files)
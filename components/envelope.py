@@ -0,0 +1,96 @@
+import numpy as np
+
+from utils.signal import fingerprint
+from . import scheduler
+from .features import LRUCache
+
+BASE_BLOCK = 64
+FACTOR = 4
+MAX_PYRAMID_CACHE_BYTES = 128 * 1024**2
+
+_pyramids = LRUCache(MAX_PYRAMID_CACHE_BYTES)
+
+
+def _reduce(mins: np.ndarray, maxs: np.ndarray, factor: int):
+    n_full = len(mins) // factor
+    head_min = mins[:n_full * factor].reshape(n_full, factor).min(axis=1)
+    head_max = maxs[:n_full * factor].reshape(n_full, factor).max(axis=1)
+    if len(mins) % factor:
+        head_min = np.append(head_min, mins[n_full * factor:].min())
+        head_max = np.append(head_max, maxs[n_full * factor:].max())
+    return head_min, head_max
+
+
+def _build_pyramid(y: np.ndarray, key: str):
+    mins, maxs = _reduce(y, y, BASE_BLOCK)
+    levels = [(BASE_BLOCK, mins, maxs)]
+    while len(mins) > FACTOR:
+        mins, maxs = _reduce(mins, maxs, FACTOR)
+        levels.append((levels[-1][0] * FACTOR, mins, maxs))
+    nbytes = sum(mins.nbytes + maxs.nbytes for _, mins, maxs in levels)
+    return _pyramids.put(key, levels, nbytes)
+
+
+def envelope_pyramid(y: np.ndarray):
+    """
+    Min/max envelope of ``y`` at block sizes BASE_BLOCK * FACTOR ** level,
+    as a list of ``(block_size, mins, maxs)`` from finest to coarsest.
+    """
+    key = fingerprint(y)
+    levels = _pyramids.get(key)
+    if levels is not None:
+        return levels
+    future = scheduler.pending(("envelope", key))
+    if future is not None:
+        return future.result()
+    return _build_pyramid(y, key)
+
+
+def prefetch_envelopes(*signals):
+    """
+    Start building the envelopes of ``signals`` on the compute pool so that
+    a later ``envelope_pyramid`` call finds them ready.
+    """
+    for y in signals:
+        if y is None:
+            continue
+        key = fingerprint(y)
+        if _pyramids.get(key) is None:
+            scheduler.submit_once(("envelope", key), _build_pyramid, y, key)
+
+
+def plot_envelope(ax,
+                  y: np.ndarray,
+                  sr: int,
+                  start_index: int,
+                  end_index: int,
+                  pyramid: list,
+                  width_px: int,
+                  **kwargs):
+    """
+    Draw ``y[start_index:end_index]`` with time starting at 0, using the
+    coarsest pyramid level that still has a block per pixel so the number
+    of drawn points stays close to ``width_px`` whatever the window length.
+    """
+    n_samples = end_index - start_index
+    if n_samples <= 2 * width_px:
+        times = np.arange(n_samples) / sr
+        ax.plot(times, y[start_index:end_index], **kwargs)
+    else:
+        block_size, mins, maxs = pyramid[0]
+        for level in pyramid:
+            if level[0] * width_px > n_samples:
+                break
+            block_size, mins, maxs = level
+        first = start_index // block_size
+        last = -(-end_index // block_size)
+        times = (np.arange(first, last) * block_size - start_index) / sr
+        ax.fill_between(
+            np.maximum(times, 0),
+            mins[first:last],
+            maxs[first:last],
+            step="post",
+            linewidth=0,
+            **kwargs)
+    ax.set_xlim(0, n_samples / sr)
+    ax.set_xlabel("Time")
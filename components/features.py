@@ -0,0 +1,205 @@
+import threading
+
+import librosa
+import numpy as np
+
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from utils import instrument
+from utils.signal import fingerprint
+
+TILE_FRAMES = 256
+MAX_TILE_CACHE_BYTES = 512 * 1024**2
+MAX_STAGE_CACHE_BYTES = 256 * 1024**2
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by the total ``nbytes`` of its values.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()  # type: ignore
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, nbytes: Optional[int] = None):
+        if nbytes is None:
+            nbytes = value.nbytes
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+_tiles = LRUCache(MAX_TILE_CACHE_BYTES)
+# windowed intermediate results of the feature stages
+_stages = LRUCache(MAX_STAGE_CACHE_BYTES)
+
+
+def _padded_segment(y, start: int, stop: int, pad: int):
+    # equivalent to np.pad(y, pad, mode="reflect")[start:stop] without
+    # padding (and copying) the whole signal; y only needs len() and
+    # contiguous slicing, so it may also be a utils.AudioFile
+    if len(y) <= pad:
+        return np.pad(y[:], pad, mode="reflect")[start:stop]
+    lo = start - pad
+    hi = stop - pad
+    if lo >= 0 and hi <= len(y):
+        return y[lo:hi]
+    index = np.abs(np.arange(lo, hi))
+    index = np.where(index >= len(y), 2 * (len(y) - 1) - index, index)
+    first = index.min()
+    return y[first:index.max() + 1][index - first]
+
+
+def _memoized(cache_key, compute):
+    value = _stages.get(cache_key)
+    if value is None:
+        instrument.mark_miss()
+        value = _stages.put(cache_key, compute())
+    return value
+
+
+@lru_cache(maxsize=32)
+def mel_filterbank(sr: int, n_fft: int, n_mels: int, fmin: float,
+                   fmax: float) -> np.ndarray:
+    return librosa.filters.mel(sr, n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax)
+
+
+def _tile(y: np.ndarray, key: str, n_fft: int, hop_length: int,
+          tile_index: int):
+    cache_key = (key, n_fft, hop_length, tile_index)
+    tile = _tiles.get(cache_key)
+    if tile is not None:
+        return tile
+
+    # frames of a centered STFT over the whole signal are the frames of an
+    # uncentered STFT over the reflect-padded signal, so a tile only needs
+    # its own frames' samples (consecutive tiles overlap by n_fft - hop)
+    n_frames = 1 + len(y) // hop_length
+    first = tile_index * TILE_FRAMES
+    last = min(first + TILE_FRAMES, n_frames)
+    segment = _padded_segment(y, first * hop_length,
+                              (last - 1) * hop_length + n_fft, n_fft // 2)
+    tile = np.abs(
+        librosa.stft(
+            segment, n_fft=n_fft, hop_length=hop_length, center=False))
+    return _tiles.put(cache_key, tile)
+
+
+def _window_frames(y: np.ndarray, hop_length: int,
+                   window: Optional[Tuple[int, int]]):
+    n_frames = 1 + len(y) // hop_length
+    if window is None:
+        return 0, n_frames
+    start_index, end_index = window
+    first = int(round(start_index / hop_length))
+    last = min(first + 1 + (end_index - start_index) // hop_length, n_frames)
+    return first, last
+
+
+def _stitch(y: np.ndarray, key: str, n_fft: int, hop_length: int, first: int,
+            last: int):
+    first_tile = first // TILE_FRAMES
+    tiles = [
+        _tile(y, key, n_fft, hop_length, i)
+        for i in range(first_tile, (last - 1) // TILE_FRAMES + 1)
+    ]
+    offset = first_tile * TILE_FRAMES
+    return np.concatenate(tiles, axis=1)[:, first - offset:last - offset]
+
+
+def _stage_key(y: np.ndarray, params: dict,
+               window: Optional[Tuple[int, int]], key: Optional[str]):
+    if key is None:
+        # keyed signals return their key, others are hashed once here
+        key = fingerprint(y)
+    first, last = _window_frames(y, params["hop_length"], window)
+    return key, params["n_fft"], params["hop_length"], first, last
+
+
+def magnitude(y: np.ndarray,
+              params: dict,
+              window: Optional[Tuple[int, int]] = None,
+              key: Optional[str] = None):
+    """
+    STFT magnitude of ``y[window[0]:window[1]]`` stitched from cached
+    fixed-length tiles of the whole signal, so that moving the window only
+    computes tiles that haven't been seen yet.
+    """
+    stage_key = _stage_key(y, params, window, key)
+    return _memoized(stage_key + ("magnitude", ),
+                     lambda: _stitch(y, *stage_key))
+
+
+def power(y: np.ndarray,
+          params: dict,
+          window: Optional[Tuple[int, int]] = None,
+          key: Optional[str] = None):
+    stage_key = _stage_key(y, params, window, key)
+    return _memoized(stage_key + ("power", ),
+                     lambda: magnitude(y, params, window, stage_key[0])**2)
+
+
+@instrument.timed("melspectrogram", cached=True)
+def melspectrogram(y: np.ndarray,
+                   params: dict,
+                   log=True,
+                   window: Optional[Tuple[int, int]] = None,
+                   key: Optional[str] = None):
+    """
+    STFT magnitude -> power -> mel projection -> dB, each stage memoized on
+    its own inputs so that changing a mel or display parameter only reruns
+    the stages after it.
+    """
+    stage_key = _stage_key(y, params, window, key)
+    mel_key = stage_key + ("mel", params["sr"], params["n_mels"],
+                           params["fmin"], params["fmax"])
+
+    def project():
+        mel_basis = mel_filterbank(params["sr"], params["n_fft"],
+                                   params["n_mels"], params["fmin"],
+                                   params["fmax"])
+        return mel_basis.dot(power(y, params, window, stage_key[0]))
+
+    melspec = _memoized(mel_key, project)
+    if log:
+        melspec = _memoized(mel_key + ("db", ),
+                            lambda: librosa.power_to_db(melspec))
+    return melspec
+
+
+@instrument.timed("spectrogram", cached=True)
+def spectrogram(y: np.ndarray,
+                params: dict,
+                log=True,
+                window: Optional[Tuple[int, int]] = None,
+                key: Optional[str] = None):
+    stage_key = _stage_key(y, params, window, key)
+    spec = magnitude(y, params, window, stage_key[0])
+    if log:
+        spec = _memoized(stage_key + ("magnitude", "db"),
+                         lambda: librosa.power_to_db(spec))
+    return spec
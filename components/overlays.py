@@ -0,0 +1,95 @@
+import numpy as np
+
+from matplotlib.collections import BrokenBarHCollection, PolyCollection
+from matplotlib.patches import Patch
+
+COLORS = [
+    "#bf6565", "#ac7ceb", "#e3e176", "#f081e1", "#e8cb6b", "#25b4db",
+    "#fa787e", "#a9f274", "#1d7335", "#797fb3"
+]
+
+
+def group_events(labels: np.ndarray, onsets: np.ndarray,
+                 offsets: np.ndarray):
+    """
+    Split columnar events into ``(label, onsets, offsets, color)`` groups,
+    labels in order of first appearance, colors cycling through COLORS.
+    """
+    uniq, first, codes = np.unique(
+        np.asarray(labels, dtype=str), return_index=True, return_inverse=True)
+    groups = []
+    for i, code in enumerate(np.argsort(first)):
+        in_group = codes == code
+        groups.append((uniq[code], onsets[in_group], offsets[in_group],
+                       COLORS[i % len(COLORS)]))
+    return groups
+
+
+def visible(t_min: np.ndarray, t_max: np.ndarray, start: float, end: float):
+    return (t_max >= start) & (t_min <= end)
+
+
+def add_spans(ax,
+              t_min: np.ndarray,
+              t_max: np.ndarray,
+              color,
+              start: float = 0.0,
+              end: float = np.inf,
+              alpha: float = 0.5):
+    """
+    Draw all ``[t_min, t_max]`` spans of one label across the full height of
+    ``ax`` as a single collection. Events outside ``[start, end]`` are
+    dropped first and times are shifted so that ``start`` is at 0.
+    """
+    keep = visible(t_min, t_max, start, end)
+    if not keep.any():
+        return
+    xranges = np.stack([t_min[keep] - start, t_max[keep] - t_min[keep]],
+                       axis=1)
+    ax.add_collection(
+        BrokenBarHCollection(
+            xranges, (0, 1),
+            facecolors=color,
+            alpha=alpha,
+            transform=ax.get_xaxis_transform()))
+
+
+def add_boxes(ax,
+              t_min: np.ndarray,
+              t_max: np.ndarray,
+              f_min: np.ndarray,
+              f_max: np.ndarray,
+              color,
+              start: float = 0.0,
+              end: float = np.inf,
+              alpha: float = 0.5):
+    keep = visible(t_min, t_max, start, end)
+    if not keep.any():
+        return
+    left = t_min[keep] - start
+    right = t_max[keep] - start
+    bottom = f_min[keep]
+    top = f_max[keep]
+    verts = np.stack([
+        np.stack([left, bottom], axis=1),
+        np.stack([left, top], axis=1),
+        np.stack([right, top], axis=1),
+        np.stack([right, bottom], axis=1),
+    ],
+                     axis=1)
+    ax.add_collection(
+        PolyCollection(
+            verts,
+            facecolors=color,
+            edgecolors=color,
+            linewidths=1,
+            alpha=alpha))
+
+
+def legend(ax, labels, colors, alpha: float = 0.5):
+    handles = [
+        Patch(facecolor=color, alpha=alpha, label=str(label))
+        for label, color in zip(labels, colors)
+    ]
+    if handles:
+        ax.legend(handles=handles)
@@ -1,180 +1,273 @@
-import librosa
 import librosa.display as display
 import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 import numpy as np
 import pandas as pd
 import streamlit as st
-
-
-def waveplot(y: np.ndarray, sr: int, processed=None, tp: pd.DataFrame=None, fp: pd.DataFrame=None):
+import utils
+
+from pathlib import Path
+from typing import Optional
+
+from utils import instrument
+from . import scheduler
+from .envelope import envelope_pyramid, plot_envelope
+from .features import melspectrogram, spectrogram
+from .overlays import add_boxes, add_spans, group_events, legend
+from .render import DISPLAY_WIDTH, render_spectrogram
+
+
+def _select_window(duration: float, key: str):
+    start_second = st.sidebar.number_input(
+        "start second",
+        min_value=0,
+        max_value=int(duration),
+        value=0,
+        step=1,
+        key=f"{key}_start")
+    end_second = st.sidebar.number_input(
+        "end second",
+        min_value=0,
+        max_value=int(duration),
+        value=int(duration),
+        step=1,
+        key=f"{key}_end")
+    if end_second == int(duration):
+        end_second = duration
+    return start_second, end_second
+
+
+def _slice_window(y: Optional[np.ndarray],
+                  sr: int,
+                  start_second: float,
+                  end_second: float,
+                  path: Optional[Path] = None,
+                  info: Optional[dict] = None,
+                  quality: str = "polyphase"):
+    if y is None:
+        return utils.read_audio_range(
+            path, info, start_second, end_second, sr=sr, quality=quality)
+    return y[int(round(start_second * sr)):int(round(end_second * sr))]
+
+
+def _plot_wave(ax,
+               y: Optional[np.ndarray],
+               sr: int,
+               start_second: float,
+               end_second: float,
+               path: Optional[Path] = None,
+               info: Optional[dict] = None,
+               quality: str = "polyphase",
+               **kwargs):
+    if y is None:
+        y = _slice_window(None, sr, start_second, end_second, path, info,
+                          quality)
+        start_second, end_second = 0, len(y) / sr
+    start_index = int(round(start_second * sr))
+    end_index = min(int(round(end_second * sr)), len(y))
+    width_px = int(ax.figure.get_figwidth() * ax.figure.dpi)
+    plot_envelope(ax, y, sr, start_index, end_index, envelope_pyramid(y),
+                  width_px, **kwargs)
+
+
+def _spectrogram_source(y: Optional[np.ndarray],
+                        sr: int,
+                        start_second: float,
+                        end_second: float,
+                        path: Optional[Path] = None,
+                        info: Optional[dict] = None,
+                        quality: str = "polyphase"):
+    # spectrograms are computed on the whole signal and cut to the window so
+    # that their tiles can be reused across windows; without a signal, the
+    # tiles read only their own sample ranges of the file
+    if y is None:
+        y = utils.AudioFile(path, info, sr, quality)
+    start_index = int(round(start_second * sr))
+    end_index = min(int(round(end_second * sr)), len(y))
+    return y, (start_index, end_index)
+
+
+def _show_images(spec: np.ndarray,
+                 spec_processed: Optional[np.ndarray],
+                 sr: int,
+                 hop_length: int,
+                 mel: bool,
+                 fmin: float,
+                 fmax: Optional[float],
+                 boxes=(),
+                 spans=(),
+                 legend=(),
+                 container=st):
+    with st.spinner("Plotting"):
+        images = [
+            render_spectrogram(
+                spec,
+                sr,
+                hop_length,
+                mel=mel,
+                fmin=fmin,
+                fmax=fmax,
+                boxes=boxes,
+                spans=spans,
+                legend=legend)
+        ]
+        if spec_processed is not None:
+            images.append(
+                render_spectrogram(
+                    spec_processed,
+                    sr,
+                    hop_length,
+                    mel=mel,
+                    fmin=fmin,
+                    fmax=fmax))
+        # a single element so that it can be replaced in place
+        container.image(images)
+
+
+def _compute_features(feature,
+                      y: np.ndarray,
+                      y_processed: Optional[np.ndarray],
+                      params: dict,
+                      log: bool,
+                      window=None):
+    jobs = {"spec": (feature, y, params, log, window)}
+    if y_processed is not None:
+        jobs["processed"] = (feature, y_processed, params, log, window)
+    # original and processed features are independent FFT work
+    results = scheduler.gather(jobs)
+    return results["spec"], results.get("processed")
+
+
+def _coarse_params(params: dict, y: np.ndarray, window=None):
+    """
+    Parameters for a preview pass whose hop is a multiple of the requested
+    one, so that it has at most one frame per display column and its cost
+    does not grow with the window length. None if the requested
+    resolution is already that coarse.
+    """
+    n_samples = len(y) if window is None else window[1] - window[0]
+    n_frames = 1 + n_samples // params["hop_length"]
+    factor = -(-n_frames // DISPLAY_WIDTH)
+    if factor <= 1:
+        return None
+    return dict(params, hop_length=params["hop_length"] * factor)
+
+
+def _duration(y: Optional[np.ndarray], sr: int, info: Optional[dict]):
+    if y is None:
+        return info["duration"]  # type: ignore
+    return len(y) / sr
+
+
+def waveplot(y: Optional[np.ndarray],
+             sr: int,
+             processed=None,
+             tp: pd.DataFrame = None,
+             fp: pd.DataFrame = None,
+             path: Optional[Path] = None,
+             info: Optional[dict] = None,
+             quality: str = "polyphase"):
     plot_wave = st.checkbox("Waveplot")
     if plot_wave:
         st.sidebar.markdown("#### Waveplot settings")
-        start_second = st.sidebar.number_input(
-            "start second",
-            min_value=0,
-            max_value=len(y) // sr,
-            value=0,
-            step=1,
-            key="waveplot_start")
-        end_second = st.sidebar.number_input(
-            "end second",
-            min_value=0,
-            max_value=len(y) // sr,
-            value=len(y) // sr,
-            step=1,
-            key="waveplot_end")
-
-        start_index = start_second * sr
-        if end_second == len(y) // sr:
-            end_index = len(y)
-        else:
-            end_index = end_second * sr
+        start_second, end_second = _select_window(
+            _duration(y, sr, info), "waveplot")
+
         fig = plt.figure(figsize=(12, 4))
+        ax = plt.axes()
         plt.grid(True)
-        display.waveplot(y[start_index:end_index], sr=sr, alpha=0.5)
+        _plot_wave(
+            ax, y, sr, start_second, end_second, path, info, quality,
+            alpha=0.5)
         if processed is not None:
-            display.waveplot(
-                processed[start_index:end_index],
-                sr=sr,
+            _plot_wave(
+                ax,
+                processed,
+                sr,
+                start_second,
+                end_second,
                 alpha=0.5,
                 color="red")
-        if tp is not None and len(tp) > 0:
-            for _, row in tp.iterrows():
-                plt.axvspan(row["t_min"], row["t_max"], color="g", alpha=0.5, label=str(row["species_id"]))
-
-        if fp is not None and len(fp) > 0:
-            for _, row in fp.iterrows():
-                plt.axvspan(row["t_min"], row["t_max"], color="r", alpha=0.5, label=str(row["species_id"]))
-        plt.legend()
-
-        st.pyplot(fig)
+        labels = []
+        label_colors = []
+        for events, color, kind in [(tp, "g", "tp"), (fp, "r", "fp")]:
+            if events is not None and len(events) > 0:
+                add_spans(ax, events["t_min"].values, events["t_max"].values,
+                          color, start_second, end_second)
+                species = ", ".join(map(str, pd.unique(events["species_id"])))
+                labels.append(f"{kind} ({species})")
+                label_colors.append(color)
+        legend(ax, labels, label_colors)
+
+        with instrument.stage("st.pyplot"):
+            st.pyplot(fig)
 
 
-def waveplot_with_annotation(y: np.ndarray,
+def waveplot_with_annotation(y: Optional[np.ndarray],
                              sr: int,
-                             annotation: pd.DataFrame,
+                             annotation: utils.AnnotationIndex,
                              filename: str,
-                             processed=None):
+                             processed=None,
+                             path: Optional[Path] = None,
+                             info: Optional[dict] = None,
+                             quality: str = "polyphase"):
     plot_wave = st.checkbox("Waveplot")
     if filename.endswith(".mp3"):
         filename = filename.replace(".mp3", ".wav")
-    events = annotation.query(f"filename == '{filename}'")
-    colors = [
-        "#bf6565", "#ac7ceb", "#e3e176", "#f081e1", "#e8cb6b", "#25b4db",
-        "#fa787e", "#a9f274", "#1d7335", "#797fb3"
-    ]
     if plot_wave:
         st.sidebar.markdown("#### Waveplot settings")
-        start_second = st.sidebar.number_input(
-            "start second",
-            min_value=0,
-            max_value=len(y) // sr,
-            value=0,
-            step=1,
-            key="waveplot_start")
-        end_second = st.sidebar.number_input(
-            "end second",
-            min_value=0,
-            max_value=len(y) // sr,
-            value=len(y) // sr,
-            step=1,
-            key="waveplot_end")
-
-        start_index = start_second * sr
-        if end_second == len(y) // sr:
-            end_index = len(y)
-            end_second = len(y) / sr
-        else:
-            end_index = end_second * sr
-        events_in_period = events.query(
-            f"onset >= {start_second} & offset <= {end_second}")
-        uniq_labels = events_in_period["ebird_code"].unique().tolist()
+        start_second, end_second = _select_window(
+            _duration(y, sr, info), "waveplot")
+        events_in_period = annotation.in_window(filename, start_second,
+                                                end_second)
+        groups = group_events(events_in_period["ebird_code"].values,
+                              events_in_period["onset"].values,
+                              events_in_period["offset"].values)
         fig = plt.figure(figsize=(12, 4))
+        ax = plt.axes()
         plt.grid(True)
-        display.waveplot(y[start_index:end_index], sr=sr, alpha=0.5)
-
-        used_color = []  # type: ignore
-        for i, event in events_in_period.iterrows():
-            onset = event.onset
-            offset = event.offset
-            color = colors[uniq_labels.index(event.ebird_code)]
-            if color not in used_color:
-                label = event.ebird_code
-                used_color.append(color)
-            else:
-                label = "_" + event.ebird_code
-            plt.axvspan(onset, offset, facecolor=color, alpha=0.5, label=label)
+        _plot_wave(
+            ax, y, sr, start_second, end_second, path, info, quality,
+            alpha=0.5)
 
-        plt.legend()
+        for _, onsets, offsets, color in groups:
+            add_spans(ax, onsets, offsets, color, start_second, end_second)
+        legend(ax, [group[0] for group in groups],
+               [group[3] for group in groups])
 
         if processed is not None:
-            display.waveplot(
-                processed[start_index:end_index],
-                sr=sr,
+            _plot_wave(
+                ax,
+                processed,
+                sr,
+                start_second,
+                end_second,
                 alpha=0.5,
                 color="red")
 
-        st.pyplot(fig)
-
-
-@st.cache
-def melspectrogram(y: np.ndarray, params: dict, log=True):
-    melspec = librosa.feature.melspectrogram(y=y, **params)
-    if log:
-        melspec = librosa.power_to_db(melspec)
-    return melspec
-
-
-@st.cache
-def spectrogram(y: np.ndarray, params: dict, log=True):
-    spec = librosa.stft(y, **params)
-    if log:
-        spec = librosa.power_to_db(spec)
-    return spec
+        with instrument.stage("st.pyplot"):
+            st.pyplot(fig)
 
 
-def specshow_with_annotation(y: np.ndarray,
+def specshow_with_annotation(y: Optional[np.ndarray],
                              sr: int,
-                             annotation: pd.DataFrame,
+                             annotation: utils.AnnotationIndex,
                              filename: str,
-                             y_processed=None):
+                             y_processed=None,
+                             path: Optional[Path] = None,
+                             info: Optional[dict] = None,
+                             quality: str = "polyphase"):
     plot_spectrogram = st.checkbox("Spectrogram plot")
     if filename.endswith(".mp3"):
         filename = filename.replace(".mp3", ".wav")
-    events = annotation.query(f"filename == '{filename}'")
-    colors = [
-        "#bf6565", "#ac7ceb", "#e3e176", "#f081e1", "#e8cb6b", "#25b4db",
-        "#fa787e", "#a9f274", "#1d7335", "#797fb3"
-    ]
     if plot_spectrogram:
         st.sidebar.markdown("#### Spectrogram plot settings")
-        start_second = st.sidebar.number_input(
-            "start second",
-            min_value=0,
-            max_value=len(y) // sr,
-            value=0,
-            step=1,
-            key="specshow_start")
-        end_second = st.sidebar.number_input(
-            "end second",
-            min_value=0,
-            max_value=len(y) // sr,
-            value=len(y) // sr,
-            step=1,
-            key="specshow_end")
-        start_index = start_second * sr
-        if end_second == len(y) // sr:
-            end_index = len(y)
-        else:
-            end_index = end_second * sr
-        y_plot = y[start_index:end_index]
-        if y_processed is not None:
-            y_plot_processed = y_processed[start_index:end_index]
-        events_in_period = events.query(
-            f"onset >= {start_second} & offset <= {end_second}")
-        uniq_labels = events_in_period["ebird_code"].unique().tolist()
+        start_second, end_second = _select_window(
+            _duration(y, sr, info), "specshow")
+        events_in_period = annotation.in_window(filename, start_second,
+                                                end_second)
+        groups = group_events(events_in_period["ebird_code"].values,
+                              events_in_period["onset"].values,
+                              events_in_period["offset"].values)
 
         st.sidebar.markdown("##### (Mel)spectrogram parameters")
         mel = st.sidebar.checkbox("Mel scale", value=True)
@@ -191,6 +284,10 @@ def specshow_with_annotation(y: np.ndarray,
             fmax = st.sidebar.number_input(
                 "fmax", min_value=4000, max_value=44100, value=14000, step=100)
         log = st.sidebar.checkbox("apply log", value=True)
+        renderer = st.sidebar.radio(
+            "Renderer", options=["image", "matplotlib"], key="specshow_renderer")
+        progressive = st.sidebar.checkbox(
+            "Progressive rendering", value=True, key="specshow_progressive")
 
         if mel:
             melspec_params = {
@@ -207,22 +304,61 @@ def specshow_with_annotation(y: np.ndarray,
                 "hop_length": hop_length
             }
 
+        spans = [(onsets - start_second, offsets - start_second, color)
+                 for _, onsets, offsets, color in groups]
+        labels = [(label, color) for label, _, _, color in groups]
+
         if st.button("Show melspectrogram"):
-            with st.spinner("Calculating melspectrogram"):
+            with st.spinner("Loading audio"):
+                y_source, window = _spectrogram_source(
+                    y, sr, start_second, end_second, path, info, quality)
                 if mel:
-                    spec = melspectrogram(y_plot, melspec_params, log)
+                    feature, params = melspectrogram, melspec_params
                 else:
-                    spec = spectrogram(y_plot, spec_params, log)
-                if y_processed is not None:
-                    if mel:
-                        spec_processed = melspectrogram(y_plot_processed,
-                                                        melspec_params, log)
-                    else:
-                        spec_processed = spectrogram(y_plot_processed,
-                                                     spec_params, log)
+                    feature, params = spectrogram, spec_params
+            size_line = st.empty()
+            placeholder = st.empty()
+            coarse = _coarse_params(params, y_source,
+                                    window) if progressive else None
+            if coarse is not None:
+                # a cheap preview first, replaced below once the requested
+                # resolution is ready
+                with st.spinner("Calculating preview"):
+                    preview, preview_processed = _compute_features(
+                        feature, y_source, y_processed, coarse, log, window)
+                height, width = preview.shape
+                size_line.write(f"{height} x {width} matrix (preview)")
+                _show_images(
+                    preview,
+                    preview_processed,
+                    sr,
+                    coarse["hop_length"],
+                    mel,
+                    fmin if mel else 0.0,
+                    fmax if mel else None,
+                    spans=spans,
+                    legend=labels,
+                    container=placeholder)
+
+            with st.spinner("Calculating melspectrogram"):
+                spec, spec_processed = _compute_features(
+                    feature, y_source, y_processed, params, log, window)
 
             height, width = spec.shape
-            st.write(f"{height} x {width} matrix")
+            size_line.write(f"{height} x {width} matrix")
+            if renderer == "image":
+                _show_images(
+                    spec,
+                    spec_processed,
+                    sr,
+                    hop_length,
+                    mel,
+                    fmin if mel else 0.0,
+                    fmax if mel else None,
+                    spans=spans,
+                    legend=labels,
+                    container=placeholder)
+                return
             if y_processed is not None:
                 with st.spinner("Plotting"):
                     fig = plt.figure(figsize=(12, 8))
@@ -246,24 +382,11 @@ def specshow_with_annotation(y: np.ndarray,
                             y_axis="linear",
                             ax=ax1)
 
-                    used_color = []  # type: ignore
-                    for i, event in events_in_period.iterrows():
-                        onset = event.onset
-                        offset = event.offset
-                        color = colors[uniq_labels.index(event.ebird_code)]
-                        if color not in used_color:
-                            label = event.ebird_code
-                            used_color.append(color)
-                        else:
-                            label = "_" + event.ebird_code
-                        ax1.axvspan(
-                            onset,
-                            offset,
-                            facecolor=color,
-                            alpha=0.5,
-                            label=label)
-
-                    ax1.legend()
+                    for _, onsets, offsets, color in groups:
+                        add_spans(ax1, onsets, offsets, color, start_second,
+                                  end_second)
+                    legend(ax1, [group[0] for group in groups],
+                           [group[3] for group in groups])
 
                     ax2 = fig.add_subplot(2, 1, 2)
                     if mel:
@@ -307,54 +430,30 @@ def specshow_with_annotation(y: np.ndarray,
                             y_axis="linear")
                         plt.colorbar()
 
-                    used_color = []  # type: ignore
-                    for i, event in events_in_period.iterrows():
-                        onset = event.onset
-                        offset = event.offset
-                        color = colors[uniq_labels.index(event.ebird_code)]
-                        if color not in used_color:
-                            label = event.ebird_code
-                            used_color.append(color)
-                        else:
-                            label = "_" + event.ebird_code
-                        plt.axvspan(
-                            onset,
-                            offset,
-                            facecolor=color,
-                            alpha=0.5,
-                            label=label)
-
-                        plt.legend()
-
-            st.pyplot(fig)
-
-
-def specshow(y: np.ndarray, sr: int, y_processed=None, tp: pd.DataFrame=None, fp: pd.DataFrame=None):
+                    ax = plt.gca()
+                    for _, onsets, offsets, color in groups:
+                        add_spans(ax, onsets, offsets, color, start_second,
+                                  end_second)
+                    legend(ax, [group[0] for group in groups],
+                           [group[3] for group in groups])
+
+            with instrument.stage("st.pyplot"):
+                placeholder.pyplot(fig)
+
+
+def specshow(y: Optional[np.ndarray],
+             sr: int,
+             y_processed=None,
+             tp: pd.DataFrame = None,
+             fp: pd.DataFrame = None,
+             path: Optional[Path] = None,
+             info: Optional[dict] = None,
+             quality: str = "polyphase"):
     plot_spectrogram = st.checkbox("Spectrogram plot")
     if plot_spectrogram:
         st.sidebar.markdown("#### Spectrogram plot settings")
-        start_second = st.sidebar.number_input(
-            "start second",
-            min_value=0,
-            max_value=len(y) // sr,
-            value=0,
-            step=1,
-            key="specshow_start")
-        end_second = st.sidebar.number_input(
-            "end second",
-            min_value=0,
-            max_value=len(y) // sr,
-            value=len(y) // sr,
-            step=1,
-            key="specshow_end")
-        start_index = start_second * sr
-        if end_second == len(y) // sr:
-            end_index = len(y)
-        else:
-            end_index = end_second * sr
-        y_plot = y[start_index:end_index]
-        if y_processed is not None:
-            y_plot_processed = y_processed[start_index:end_index]
+        start_second, end_second = _select_window(
+            _duration(y, sr, info), "specshow")
 
         st.sidebar.markdown("##### (Mel)spectrogram parameters")
         mel = st.sidebar.checkbox("Mel scale", value=True)
@@ -371,6 +470,10 @@ def specshow(y: np.ndarray, sr: int, y_processed=None, tp: pd.DataFrame=None, fp
             fmax = st.sidebar.number_input(
                 "fmax", min_value=4000, max_value=44100, value=14000, step=100)
         log = st.sidebar.checkbox("apply log", value=True)
+        renderer = st.sidebar.radio(
+            "Renderer", options=["image", "matplotlib"], key="specshow_renderer")
+        progressive = st.sidebar.checkbox(
+            "Progressive rendering", value=True, key="specshow_progressive")
 
         if mel:
             melspec_params = {
@@ -387,22 +490,64 @@ def specshow(y: np.ndarray, sr: int, y_processed=None, tp: pd.DataFrame=None, fp
                 "hop_length": hop_length
             }
 
+        # overlays of the preview and of the full-resolution image
+        boxes = []
+        for events, color in [(tp, "g"), (fp, "r")]:
+            if events is not None and len(events) > 0:
+                boxes.append((events["t_min"].values - start_second,
+                              events["t_max"].values - start_second,
+                              events["f_min"].values,
+                              events["f_max"].values, color))
+
         if st.button("Show melspectrogram"):
-            with st.spinner("Calculating melspectrogram"):
+            with st.spinner("Loading audio"):
+                y_source, window = _spectrogram_source(
+                    y, sr, start_second, end_second, path, info, quality)
                 if mel:
-                    spec = melspectrogram(y_plot, melspec_params, log)
+                    feature, params = melspectrogram, melspec_params
                 else:
-                    spec = spectrogram(y_plot, spec_params, log)
-                if y_processed is not None:
-                    if mel:
-                        spec_processed = melspectrogram(y_plot_processed,
-                                                        melspec_params, log)
-                    else:
-                        spec_processed = spectrogram(y_plot_processed,
-                                                     spec_params, log)
+                    feature, params = spectrogram, spec_params
+            size_line = st.empty()
+            placeholder = st.empty()
+            coarse = _coarse_params(params, y_source,
+                                    window) if progressive else None
+            if coarse is not None:
+                # a cheap preview first, replaced below once the requested
+                # resolution is ready
+                with st.spinner("Calculating preview"):
+                    preview, preview_processed = _compute_features(
+                        feature, y_source, y_processed, coarse, log, window)
+                height, width = preview.shape
+                size_line.write(f"{height} x {width} matrix (preview)")
+                _show_images(
+                    preview,
+                    preview_processed,
+                    sr,
+                    coarse["hop_length"],
+                    mel,
+                    fmin if mel else 0.0,
+                    fmax if mel else None,
+                    boxes=boxes,
+                    container=placeholder)
+
+            with st.spinner("Calculating melspectrogram"):
+                spec, spec_processed = _compute_features(
+                    feature, y_source, y_processed, params, log, window)
 
             height, width = spec.shape
-            st.write(f"{height} x {width} matrix")
+            size_line.write(f"{height} x {width} matrix")
+            if renderer == "image":
+                _show_images(
+                    spec,
+                    spec_processed,
+                    sr,
+                    hop_length,
+                    mel,
+                    fmin if mel else 0.0,
+                    fmax if mel else None,
+                    boxes=boxes,
+                    container=placeholder)
+                return
             if y_processed is not None:
                 with st.spinner("Plotting"):
                     fig = plt.figure(figsize=(12, 8))
@@ -467,28 +612,12 @@ def specshow(y: np.ndarray, sr: int, y_processed=None, tp: pd.DataFrame=None, fp
                             x_axis="time",
                             y_axis="linear")
                         plt.colorbar()
-                    if tp is not None and len(tp) > 0:
-                        for _, row in tp.iterrows():
-                            rect = patches.Rectangle(
-                                (row["t_min"], row["f_min"]),
-                                row["t_max"] - row["t_min"],
-                                row["f_max"] - row["f_min"],
-                                linewidth=1, 
-                                edgecolor="g",
-                                facecolor="g",
-                                alpha=0.5,
-                                label="tp")
-                            ax.add_patch(rect)
-                    if fp is not None and len(fp) > 0:
-                        for _, row in fp.iterrows():
-                            rect = patches.Rectangle(
-                                (row["t_min"], row["f_min"]),
-                                row["t_max"] - row["t_min"],
-                                row["f_max"] - row["f_min"],
-                                linewidth=1,
-                                edgecolor="r",
-                                facecolor="r",
-                                alpha=0.5,
-                                label="fp")
-                            ax.add_patch(rect)
-            st.pyplot(fig)
+                    for events, color in [(tp, "g"), (fp, "r")]:
+                        if events is not None and len(events) > 0:
+                            add_boxes(ax, events["t_min"].values,
+                                      events["t_max"].values,
+                                      events["f_min"].values,
+                                      events["f_max"].values, color,
+                                      start_second, end_second)
+            with instrument.stage("st.pyplot"):
+                placeholder.pyplot(fig)
@@ -1,22 +1,93 @@
-import nussl
 import numpy as np
 import streamlit as st
-import pyroomacoustics as pra
 
-from scipy import signal
+from typing import Optional
 
+from utils import instrument
+from utils.signal import as_float32, derive, peak_abs
+from .filtering import design_sos, sosfiltfilt_blocked
+from .separation import separate, separate_in_background
+from .wiener import iterative_wiener
 
+
+@instrument.timed("butterworth_filter")
 def butterworth_filter(y: np.ndarray,
                        sr: int,
                        N: int,
                        cutoff=500.,
-                       btype="lowpass"):
-    b, a = signal.butter(N, cutoff / (sr / 2.), btype=btype)
-    y_filtered = signal.filtfilt(b, a, y)
-    return y_filtered
+                       btype="lowpass",
+                       out: Optional[np.ndarray] = None):
+    if isinstance(cutoff, (list, tuple)):
+        cutoff = tuple(float(c) for c in cutoff)
+    else:
+        cutoff = float(cutoff)
+    sos = design_sos(int(N), cutoff, int(sr), btype)
+    return sosfiltfilt_blocked(sos, y, out=out)
+
+
+def normalize(y: np.ndarray, sr: int, out: Optional[np.ndarray] = None):
+    y = as_float32(y)
+    max_vol = peak_abs(y)
+    return np.multiply(y, np.float32(1 / max_vol), out=out)
+
+
+def lowpass(y: np.ndarray, sr: int, N=4, cutoff=500., out=None):
+    return butterworth_filter(
+        y, sr=sr, N=N, cutoff=cutoff, btype="lowpass", out=out)
+
+
+def highpass(y: np.ndarray, sr: int, N=4, cutoff=1000., out=None):
+    return butterworth_filter(
+        y, sr=sr, N=N, cutoff=cutoff, btype="highpass", out=out)
 
 
-def preprocess_on_wave(y: np.ndarray, sr: int, audio_path: str):
+def bandpass(y: np.ndarray,
+             sr: int,
+             N=4,
+             lower_limit=20.,
+             upper_limit=16000.,
+             out=None):
+    if upper_limit >= sr / 2:
+        # nothing to cut above Nyquist
+        return butterworth_filter(
+            y, sr=sr, N=N, cutoff=lower_limit, btype="highpass", out=out)
+    return butterworth_filter(
+        y,
+        sr=sr,
+        N=N,
+        cutoff=(lower_limit, upper_limit),
+        btype="bandpass",
+        out=out)
+
+
+def denoise(y: np.ndarray,
+            sr: int,
+            frame_len=512,
+            lpc_order=20,
+            iterations=2,
+            alpha=0.8,
+            thresh=0.01):
+    return iterative_wiener(y, frame_len, lpc_order, iterations, alpha,
+                            thresh)
+
+
+# name -> transform(y, sr, **params); shared by the sidebar and batch.py
+TRANSFORMS = {
+    "normalize": normalize,
+    "lowpass": lowpass,
+    "highpass": highpass,
+    "bandpass": bandpass,
+    "denoise": denoise,
+    "nussl": separate,
+}
+# transforms that take out=, which may be the input itself
+IN_PLACE = {"normalize", "lowpass", "highpass", "bandpass"}
+# full-length buffers a transform may allocate, checked in debug mode
+COPIES = {"normalize": 1, "lowpass": 1, "highpass": 1, "bandpass": 1,
+          "denoise": 2}
+
+
+def preprocess_on_wave(y: np.ndarray, sr: int):
     st.sidebar.markdown("#### Preprocess option")
     option = st.sidebar.selectbox(
         "process", options=["-", "normalize", "lowpass", "highpass", "bandpass", "denoise", "nussl"])
@@ -25,9 +96,7 @@ def preprocess_on_wave(y: np.ndarray, sr: int, audio_path: str):
             "N", min_value=1, max_value=10, value=4, step=1)
         param_cutoff = st.sidebar.number_input(
             "cutoff", min_value=20.0, max_value=4000.0, value=500.0, step=10.0)
-        filtered = butterworth_filter(
-            y, sr=sr, N=param_N, cutoff=param_cutoff, btype="lowpass")
-        return np.asfortranarray(filtered)
+        params = {"N": param_N, "cutoff": param_cutoff}
     elif option == "highpass":
         param_N = st.sidebar.number_input(
             "N", min_value=1, max_value=10, value=4, step=1)
@@ -37,9 +106,7 @@ def preprocess_on_wave(y: np.ndarray, sr: int, audio_path: str):
             max_value=16000.0,
             value=1000.0,
             step=10.0)
-        filtered = butterworth_filter(
-            y, sr=sr, N=param_N, cutoff=param_cutoff, btype="highpass")
-        return np.asfortranarray(filtered)
+        params = {"N": param_N, "cutoff": param_cutoff}
     elif option == "bandpass":
         param_N = st.sidebar.number_input(
             "N", min_value=1, max_value=10, value=4, step=1)
@@ -47,15 +114,13 @@ def preprocess_on_wave(y: np.ndarray, sr: int, audio_path: str):
             "upper_limit", min_value=0.0, max_value=16000.0, value=16000.0, step=10.0)
         lower_limit = st.sidebar.number_input(
             "lower_limit", min_value=0.0, max_value=16000.0, value=20.0, step=10.0)
-        lowpassed = butterworth_filter(
-            y, sr=sr, N=param_N, cutoff=upper_limit, btype="lowpass")
-        bandpassed = butterworth_filter(
-            lowpassed, sr=sr, N=param_N, cutoff=lower_limit, btype="highpass")
-        return np.asfortranarray(bandpassed)
+        params = {
+            "N": param_N,
+            "lower_limit": lower_limit,
+            "upper_limit": upper_limit
+        }
     elif option == "normalize":
-        max_vol = np.abs(y).max()
-        y_vol = y * 1 / (max_vol)
-        return np.asfortranarray(y_vol)
+        params = {}
     elif option == "denoise":
         frame_len = st.sidebar.number_input(
             "frame_len", min_value=1, max_value=8192, value=512, step=32)
@@ -67,36 +132,32 @@ def preprocess_on_wave(y: np.ndarray, sr: int, audio_path: str):
             "alpha", min_value=0.1, max_value=10.0, value=0.8, step=0.1)
         thresh = st.sidebar.number_input(
             "thresh", min_value=0.01, value=0.01, step=0.01, max_value=10.0)
-        denoised = pra.denoise.apply_iterative_wiener(
-            y, frame_len, lpc_order, iterations, alpha, thresh)
-        return denoised
+        params = {
+            "frame_len": frame_len,
+            "lpc_order": lpc_order,
+            "iterations": iterations,
+            "alpha": alpha,
+            "thresh": thresh
+        }
     elif option == "nussl":
-        history = nussl.AudioSignal(audio_path)
         method = st.sidebar.selectbox(
             "Denoise method",
             options=[
                 "Repet", "ICA", "FT2D", "REPETSIM", "TimbreClustering", "HPSS",
                 "DUET", "PROJET"
             ])
-        if method == "Repet":
-            separator = nussl.separation.primitive.Repet(history)
-        elif method == "ICA":
-            separator = nussl.separation.factorization.ICA(history)
-        elif method == "FT2D":
-            separator = nussl.separation.primitive.FT2D(history)
-        elif method == "REMETSIM":
-            separator = nussl.separation.primitive.REMETSIM(history)
-        elif method == "TimbreClustering":
-            separator = nussl.separation.primitive.TimbreClustering(history, num_sources=2, n_components=50)
-        elif method == "HPSS":
-            separator = nussl.separation.primitive.HPSS(history)
-        elif method == "DUET":
-            separator = nussl.separation.spatial.Duet(history, num_sources=2)
-        elif method == "PROJET":
-            separator = nussl.separation.spatial.Projet(history, num_sources=2)
-
-        estimates = separator()
-        foreground = estimates[1].audio_data[0]
-        return foreground
+        params = {"method": method}
+        processed = separate_in_background(y, sr, method)
+        if processed is None:
+            st.info(f"Running {method} separation in the background. "
+                    "Rerun the app to see the result once it is done.")
+            return None
+        return derive(y, processed, option, sorted(params.items()))
     else:
         return None
+
+    # y is st.cache'd and must not be overwritten, hence no out=
+    with instrument.copy_budget(y, COPIES[option], option):
+        processed = TRANSFORMS[option](y, sr, **params)
+    # key the result on the input's key so later cached stages skip hashing
+    return derive(y, processed, option, sorted(params.items()))
@@ -0,0 +1,170 @@
+import io
+
+import librosa
+import matplotlib.cm as cm
+import matplotlib.colors as mcolors
+import numpy as np
+
+from functools import lru_cache
+from PIL import Image, ImageDraw
+
+from utils import instrument
+
+DISPLAY_WIDTH = 1200
+DISPLAY_HEIGHT = 400
+MARGIN_LEFT = 56
+MARGIN_BOTTOM = 24
+MARGIN_TOP = 6
+MARGIN_RIGHT = 12
+
+
+@lru_cache(maxsize=8)
+def colormap_lut(name: str = "magma", n: int = 256) -> np.ndarray:
+    rgba = cm.get_cmap(name)(np.linspace(0, 1, n))
+    return (rgba[:, :3] * 255).astype(np.uint8)
+
+
+def _max_pool(spec: np.ndarray, size: int, axis: int):
+    if spec.shape[axis] <= size:
+        return spec
+    edges = np.unique(np.linspace(0, spec.shape[axis], size + 1).astype(int))
+    return np.maximum.reduceat(spec, edges[:-1], axis=axis)
+
+
+def _nice_step(span: float, max_ticks: int = 10):
+    raw = span / max_ticks
+    if raw <= 0:
+        return 1.0
+    magnitude = 10**np.floor(np.log10(raw))
+    for m in (1, 2, 5, 10):
+        if m * magnitude >= raw:
+            return m * magnitude
+    return 10 * magnitude
+
+
+class _Axes:
+    """
+    Maps time (seconds) and frequency (Hz) to pixel coordinates of the image
+    area, mirroring the axes librosa's specshow would draw.
+    """
+
+    def __init__(self, duration, width, height, mel, fmin, fmax):
+        self.duration = duration
+        self.width = width
+        self.height = height
+        self.mel = mel
+        self.fmin = fmin
+        self.fmax = fmax
+
+    def x(self, t):
+        pos = np.asarray(t, dtype=float) / max(self.duration, 1e-9)
+        return MARGIN_LEFT + np.clip(pos, 0, 1) * self.width
+
+    def y(self, f):
+        f = np.clip(np.asarray(f, dtype=float), self.fmin, self.fmax)
+        if self.mel:
+            low = librosa.hz_to_mel(self.fmin)
+            high = librosa.hz_to_mel(self.fmax)
+            pos = (librosa.hz_to_mel(f) - low) / (high - low)
+        else:
+            pos = (f - self.fmin) / (self.fmax - self.fmin)
+        return MARGIN_TOP + (1 - pos) * self.height
+
+
+def _blend(canvas: np.ndarray, x0, x1, y0, y1, color, alpha: float):
+    rgb = np.array(mcolors.to_rgb(color)) * 255
+    for left, right, top, bottom in zip(
+            np.floor(x0).astype(int), np.ceil(x1).astype(int),
+            np.floor(y0).astype(int), np.ceil(y1).astype(int)):
+        if right <= left or bottom <= top:
+            continue
+        region = canvas[top:bottom, left:right]
+        region[:] = region * (1 - alpha) + rgb * alpha
+
+
+def _draw_ticks(draw, axes: "_Axes"):
+    step = _nice_step(axes.duration)
+    for t in np.arange(0, axes.duration + 1e-9, step):
+        x = axes.x(t)
+        bottom = MARGIN_TOP + axes.height
+        draw.line([(x, bottom), (x, bottom + 4)], fill="black")
+        draw.text((x - 8, bottom + 6), f"{t:g}", fill="black")
+
+    if axes.mel:
+        ticks = [axes.fmin] + [
+            f for f in (128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+            if axes.fmin < f < axes.fmax
+        ]
+    else:
+        ticks = np.arange(axes.fmin, axes.fmax + 1e-9,
+                          _nice_step(axes.fmax - axes.fmin, 6))
+    for f in ticks:
+        y = axes.y(f)
+        draw.line([(MARGIN_LEFT - 4, y), (MARGIN_LEFT, y)], fill="black")
+        draw.text((4, y - 5), f"{int(f)}", fill="black")
+
+
+@instrument.timed("render_spectrogram")
+def render_spectrogram(spec: np.ndarray,
+                       sr: int,
+                       hop_length: int,
+                       mel: bool = False,
+                       fmin: float = 0.0,
+                       fmax=None,
+                       boxes=(),
+                       spans=(),
+                       legend=(),
+                       cmap: str = "magma",
+                       width: int = DISPLAY_WIDTH,
+                       height: int = DISPLAY_HEIGHT) -> bytes:
+    """
+    Render a (dB) spectrogram straight to PNG through a colormap lookup
+    table, max-pooled to the display size first.
+
+    ``boxes`` is a sequence of ``(t_min, t_max, f_min, f_max, color)`` and
+    ``spans`` of ``(t_min, t_max, color)``, each holding arrays of events
+    sharing one color. ``legend`` is a sequence of ``(label, color)``.
+    """
+    if fmax is None:
+        fmax = sr / 2.0
+    if not mel:
+        fmin = 0.0
+    duration = spec.shape[1] * hop_length / sr
+
+    small = _max_pool(_max_pool(spec, height, 0), width, 1)
+    vmin = small.min()
+    vmax = small.max()
+    scale = 255.0 / (vmax - vmin) if vmax > vmin else 0.0
+    index = ((small[::-1] - vmin) * scale).astype(np.uint8)
+    image = colormap_lut(cmap)[index]
+
+    canvas = np.full(
+        (MARGIN_TOP + height + MARGIN_BOTTOM,
+         MARGIN_LEFT + width + MARGIN_RIGHT, 3),
+        255,
+        dtype=np.uint8)
+    canvas[MARGIN_TOP:MARGIN_TOP + height, MARGIN_LEFT:MARGIN_LEFT + width] = \
+        np.asarray(Image.fromarray(image).resize((width, height),
+                                                 Image.NEAREST))
+
+    axes = _Axes(duration, width, height, mel, fmin, fmax)
+    for t_min, t_max, f_min, f_max, color in boxes:
+        _blend(canvas, axes.x(t_min), axes.x(t_max), axes.y(f_max),
+               axes.y(f_min), color, 0.5)
+    for t_min, t_max, color in spans:
+        top = np.full(len(t_min), MARGIN_TOP)
+        _blend(canvas, axes.x(t_min), axes.x(t_max), top, top + height,
+               color, 0.5)
+
+    pil_image = Image.fromarray(canvas)
+    draw = ImageDraw.Draw(pil_image)
+    _draw_ticks(draw, axes)
+    for i, (label, color) in enumerate(legend):
+        x = MARGIN_LEFT + width - 120
+        y = MARGIN_TOP + 4 + 14 * i
+        draw.rectangle([(x, y), (x + 10, y + 10)], fill=mcolors.to_hex(color))
+        draw.text((x + 14, y), str(label), fill="white")
+
+    buffer = io.BytesIO()
+    pil_image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
@@ -0,0 +1,54 @@
+import os
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict
+
+from utils import instrument
+
+_executor = ThreadPoolExecutor(
+    max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="compute")
+_inflight = {}  # type: Dict[object, Future]
+_lock = threading.Lock()
+
+
+def submit(fn, *args, **kwargs) -> Future:
+    return _executor.submit(instrument.bind(fn), *args, **kwargs)
+
+
+def submit_once(key, fn, *args, **kwargs) -> Future:
+    """
+    Like ``submit`` but returns the pending future if a job with the same
+    ``key`` is still running instead of starting it twice.
+    """
+    with _lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future
+        future = _executor.submit(instrument.bind(fn), *args, **kwargs)
+        _inflight[key] = future
+    # outside the lock: a future that is already done runs the callback
+    # right away on this thread, and _discard takes the lock itself
+    future.add_done_callback(lambda f: _discard(key, f))
+    return future
+
+
+def _discard(key, future: Future):
+    with _lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+
+def pending(key):
+    with _lock:
+        return _inflight.get(key)
+
+
+def gather(jobs: dict) -> dict:
+    """
+    Run ``{name: (fn, *args)}`` concurrently on the compute pool and return
+    ``{name: result}``. Jobs must not call Streamlit, which only works on
+    the script thread; numpy / FFT work releases the GIL and overlaps.
+    """
+    futures = {name: submit(*job) for name, job in jobs.items()}
+    return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,93 @@
+import os
+import threading
+
+import nussl
+import numpy as np
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from utils.cache import CACHE_DIR
+from utils.signal import digest, fingerprint
+
+SEPARATION_DIR = CACHE_DIR / "separation"
+
+_executor = None  # type: Optional[ProcessPoolExecutor]
+_jobs = {}  # type: Dict[str, Future]
+_lock = threading.Lock()
+
+
+def _separator(signal: nussl.AudioSignal, method: str):
+    if method == "Repet":
+        return nussl.separation.primitive.Repet(signal)
+    elif method == "ICA":
+        return nussl.separation.factorization.ICA(signal)
+    elif method == "FT2D":
+        return nussl.separation.primitive.FT2D(signal)
+    elif method == "REPETSIM":
+        return nussl.separation.primitive.RepetSim(signal)
+    elif method == "TimbreClustering":
+        return nussl.separation.primitive.TimbreClustering(
+            signal, num_sources=2, n_components=50)
+    elif method == "HPSS":
+        return nussl.separation.primitive.HPSS(signal)
+    elif method == "DUET":
+        return nussl.separation.spatial.Duet(signal, num_sources=2)
+    elif method == "PROJET":
+        return nussl.separation.spatial.Projet(signal, num_sources=2)
+    raise ValueError(f"Unknown separation method: {method}")
+
+
+def separate(y: np.ndarray, sr: int, method="Repet"):
+    # nussl takes (channels, samples); no need to decode the file again
+    signal = nussl.AudioSignal(
+        audio_data_array=np.asarray(y)[None], sample_rate=sr)
+    estimates = _separator(signal, method)()
+    foreground = estimates[1].audio_data[0]
+    return foreground.astype(np.float32, copy=False)
+
+
+def _separate_to_file(y: np.ndarray, sr: int, method: str, path: str):
+    foreground = separate(y, sr, method)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, foreground)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=1)
+    return _executor
+
+
+def separation_path(y: np.ndarray, sr: int, method: str) -> Path:
+    return SEPARATION_DIR / f"{digest(fingerprint(y), sr, method)}.npy"
+
+
+def separate_in_background(y: np.ndarray, sr: int,
+                           method="Repet") -> Optional[np.ndarray]:
+    """
+    Foreground of ``y`` if it has been separated before (cached on disk by
+    signal fingerprint, rate and method), otherwise start the separation in
+    a worker process, at most once per input, and return None. A failed
+    job's exception is raised on the first call after it finished.
+    """
+    path = separation_path(y, sr, method)
+    if path.exists():
+        return np.load(path, mmap_mode="r")
+    key = path.stem
+    with _lock:
+        future = _jobs.get(key)
+        if future is None:
+            _jobs[key] = _pool().submit(_separate_to_file, np.asarray(y), sr,
+                                        method, str(path))
+            return None
+        if not future.done():
+            return None
+        del _jobs[key]
+    future.result()
+    return np.load(path, mmap_mode="r")
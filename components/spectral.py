@@ -0,0 +1,53 @@
+import librosa
+import numpy as np
+
+from fractions import Fraction
+from scipy import signal
+
+
+def _pitch_rate(n_steps: float, bins_per_octave: int = 12):
+    return 2.0**(-float(n_steps) / bins_per_octave)
+
+
+def pitch_time_shift(y: np.ndarray,
+                     sr: int,
+                     rate: float = 1.0,
+                     n_steps: float = 0.0,
+                     n_fft: int = 2048,
+                     hop_length=None,
+                     res_type: str = "kaiser_best"):
+    """
+    Time-stretch by ``rate`` and pitch-shift by ``n_steps`` semitones with a
+    single STFT -> phase vocoder -> ISTFT round trip followed by one
+    resample, instead of the two round trips (plus resample) that
+    ``librosa.effects.time_stretch`` and ``pitch_shift`` take in a row.
+    """
+    pitch_rate = _pitch_rate(n_steps)
+    stretch_rate = rate * pitch_rate
+    length = int(round(len(y) / rate))
+
+    stft = librosa.stft(y, n_fft=n_fft, hop_length=hop_length)
+    stft = librosa.phase_vocoder(
+        stft, stretch_rate, hop_length=hop_length)
+    y_out = librosa.istft(
+        stft,
+        hop_length=hop_length,
+        dtype=y.dtype,
+        length=int(round(len(y) / stretch_rate)))
+    if n_steps != 0:
+        y_out = librosa.resample(
+            y_out, float(sr) / pitch_rate, sr, res_type=res_type)
+    return librosa.util.fix_length(y_out, length)
+
+
+def resample_pitch_shift(y: np.ndarray, n_steps: float):
+    """
+    Cheap pitch shift for training-time augmentation: resample with a
+    rational polyphase filter and crop / pad back to the input length. The
+    content is sped up or slowed down along with the pitch.
+    """
+    if n_steps == 0:
+        return y
+    ratio = Fraction(_pitch_rate(n_steps)).limit_denominator(1000)
+    y_out = signal.resample_poly(y, ratio.numerator, ratio.denominator)
+    return librosa.util.fix_length(y_out.astype(y.dtype), len(y))
@@ -0,0 +1,239 @@
+import multiprocessing
+import os
+
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from scipy import signal
+
+from utils import instrument
+
+CHUNK_FRAMES = 4096
+# pyroomacoustics integrates the all-pole spectrum on
+# np.arange(-pi, pi, 2 * pi / 1000), i.e. 1000 points
+GAIN_GRID = 1000
+
+
+def _hann(n: int):
+    # periodic ("asymmetric") hann, so that 50% overlap adds up to one
+    return 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n) / n)
+
+
+def _frames(padded: np.ndarray, frame_len: int, hop: int, n_frames: int):
+    padded = np.ascontiguousarray(padded)
+    step = padded.strides[0]
+    return np.lib.stride_tricks.as_strided(
+        padded, shape=(n_frames, frame_len), strides=(hop * step, step),
+        writeable=False)
+
+
+def _autocorrelation(frames: np.ndarray, order: int):
+    n_fft = 2 * frames.shape[1]
+    spec = np.fft.rfft(frames, n_fft)
+    return np.fft.irfft(spec.real**2 + spec.imag**2, n_fft)[:, :order + 1]
+
+
+def _levinson(r: np.ndarray, order: int):
+    """
+    Batched Levinson-Durbin recursion: the rows of the returned ``a`` solve
+    ``toeplitz(r[k, :order]) @ a[k] = r[k, 1:]`` for every frame ``k``.
+    """
+    a = np.zeros((len(r), order))
+    err = r[:, 0].copy()
+    for i in range(order):
+        acc = r[:, i + 1] - np.einsum("kj,kj->k", a[:, :i], r[:, i:0:-1])
+        k = np.divide(acc, err, out=np.zeros_like(acc), where=err > 0)
+        previous = a[:, :i].copy()
+        a[:, i] = k
+        a[:, :i] = previous - k[:, None] * previous[:, ::-1]
+        err *= 1 - k**2
+    return a
+
+
+def _inverse_filter(a: np.ndarray):
+    return np.hstack([np.ones((len(a), 1)), -a])
+
+
+def _squared_gain(a: np.ndarray, frames: np.ndarray, noise_psd: np.ndarray):
+    # the integration grid is the GAIN_GRID-point DFT grid rotated by half a
+    # turn, so the trapezoidal rule only differs from the plain sum at the
+    # two end points (-pi and pi - step)
+    spec = np.fft.fft(_inverse_filter(a), GAIN_GRID)
+    all_pole = 1 / (spec.real**2 + spec.imag**2)
+    half = GAIN_GRID // 2
+    step = 2 * np.pi / GAIN_GRID
+    integral = step * (all_pole.sum(axis=1) - 0.5 *
+                       (all_pole[:, half] + all_pole[:, half - 1]))
+    n = frames.shape[1]
+    return (np.einsum("kn,kn->k", frames, frames) - n * noise_psd) / (
+        n / (2 * np.pi) * integral)
+
+
+def _speech_psd(frames: np.ndarray, X: np.ndarray, noise_psd: np.ndarray,
+                lpc_order: int, iterations: int):
+    """
+    All-pole speech PSD of speech ``frames`` after ``iterations`` rounds of
+    LPC on the Wiener-filtered frame, starting from the noisy one.
+    """
+    frame_len = frames.shape[1]
+    speech_psd = np.ones((len(frames), frame_len // 2 + 1))
+    s = frames
+    for _ in range(iterations):
+        a = _levinson(_autocorrelation(s, lpc_order), lpc_order)
+        g2 = _squared_gain(a, frames, noise_psd)
+        spec = np.fft.rfft(_inverse_filter(a), frame_len)
+        speech_psd = g2[:, None] / (spec.real**2 + spec.imag**2)
+        H = speech_psd / (speech_psd + noise_psd[:, None])
+        s = np.fft.irfft(X * H, frame_len)
+    return speech_psd
+
+
+def _spectrum(frames: np.ndarray):
+    # pyroomacoustics scales the frame DFT by 1 / sqrt(frame_len)
+    frame_len = frames.shape[1]
+    frames = np.asarray(frames, dtype=np.float64)
+    return np.fft.rfft(frames * _hann(frame_len)) / np.sqrt(frame_len)
+
+
+def _current_frames(blocks: np.ndarray):
+    # pyroomacoustics windows its STFT input buffer in place and then moves
+    # the raw new samples into the first half, so the frame its VAD, LPC and
+    # gain see is the new hop of samples followed by the same samples under
+    # the falling half of the window
+    hop = blocks.shape[1]
+    blocks = np.asarray(blocks, dtype=np.float64)
+    return np.hstack([blocks, blocks * _hann(2 * hop)[hop:]])
+
+
+def _denoise_chunk(segment: np.ndarray, noise_psd: np.ndarray,
+                   is_speech: np.ndarray, carry, frame_len: int,
+                   lpc_order: int, iterations: int):
+    """
+    Wiener-filter the ``len(noise_psd)`` frames of ``segment`` and overlap-add
+    them. The last ``hop`` samples of the result belong to the next chunk.
+
+    Only speech frames get a new speech PSD; noise frames reuse the one of
+    the last speech frame before them, which for the first frames of the
+    chunk is computed from ``carry`` (that frame's samples and noise PSD, or
+    None before the first speech frame of the signal).
+    """
+    hop = frame_len // 2
+    n_frames = len(noise_psd)
+    frames = _frames(segment, frame_len, hop, n_frames)
+    X = _spectrum(frames)
+
+    # row 0 holds the carried PSD, row k + 1 the PSD of frame k
+    speech_psd = np.ones((n_frames + 1, hop + 1))
+    if carry is not None:
+        frame, noise = carry
+        frame = np.asarray(frame)[None]
+        speech_psd[0] = _speech_psd(_current_frames(frame[:, hop:]),
+                                    _spectrum(frame), np.array([noise]),
+                                    lpc_order, iterations)[0]
+    speech = np.flatnonzero(is_speech)
+    if len(speech):
+        speech_psd[speech + 1] = _speech_psd(
+            _current_frames(frames[speech, hop:]), X[speech],
+            noise_psd[speech], lpc_order, iterations)
+    last = np.maximum.accumulate(
+        np.where(is_speech, np.arange(1, n_frames + 1), 0))
+    speech_psd = speech_psd[last]
+    H = speech_psd / (speech_psd + noise_psd[:, None])
+    s = np.fft.irfft(X * H, frame_len)
+
+    out = np.zeros((n_frames + 1) * hop)
+    out[:n_frames * hop] += s[:, :hop].ravel()
+    out[hop:] += s[:, hop:].ravel()
+    return out
+
+
+def _noise_psd(energy: np.ndarray, alpha: float, thresh: float):
+    # the recursive average only moves on frames quieter than thresh and
+    # holds its value in between
+    is_noise = energy < thresh
+    if not is_noise.any():
+        return np.zeros_like(energy)
+    smoothed = signal.lfilter([1 - alpha], [1, -alpha], energy[is_noise])
+    last = np.cumsum(is_noise) - 1
+    return np.where(last >= 0, smoothed[np.maximum(last, 0)], 0.0)
+
+
+def _frame_at(y: np.ndarray, k: int, hop: int):
+    # frame k covers y[(k - 1) * hop:(k + 1) * hop], zero before the start
+    if k == 0:
+        return np.concatenate([np.zeros(hop, y.dtype), y[:hop]])
+    return y[(k - 1) * hop:(k + 1) * hop]
+
+
+@instrument.timed("iterative_wiener")
+def iterative_wiener(y: np.ndarray,
+                     frame_len=512,
+                     lpc_order=20,
+                     iterations=2,
+                     alpha=0.8,
+                     thresh=0.01,
+                     workers=None):
+    """
+    ``pyroomacoustics.denoise.apply_iterative_wiener`` with the frames batched
+    into 2-D arrays. The noise estimate and the speech / noise decision of
+    every frame are computed up front. The speech PSD is then a function of
+    the last speech frame only, so chunks of frames are LPC/Wiener filtered
+    independently, in worker processes for long signals.
+
+    The output matches pyroomacoustics' (checked against 0.10), including
+    its delay of ``frame_len // 2`` samples and the unprocessed (zero) tail.
+    """
+    frame_len = int(frame_len)
+    lpc_order = int(lpc_order)
+    iterations = int(iterations)
+    if frame_len % 2:
+        raise ValueError("frame_len must be even")
+    hop = frame_len // 2
+    n_frames = len(y) // hop
+    out = np.zeros(len(y), dtype=np.result_type(y.dtype, np.float32))
+    if n_frames == 0:
+        return out
+
+    # segments are views of y except for the first, which is padded
+    y = np.asarray(y)
+    starts = range(0, n_frames, CHUNK_FRAMES)
+    segments = [
+        y[(k - 1) * hop:(min(k + CHUNK_FRAMES, n_frames)) * hop]
+        for k in starts[1:]
+    ]
+    first = y[:min(CHUNK_FRAMES, n_frames) * hop]
+    segments.insert(0, np.concatenate([np.zeros(hop, first.dtype), first]))
+    energy = np.concatenate([
+        _current_frames(segment[hop:].reshape(-1, hop)).var(axis=1)
+        for segment in segments
+    ])
+    noise_psd = _noise_psd(energy, alpha, thresh)
+    is_speech = energy >= thresh
+    last_speech = np.maximum.accumulate(
+        np.where(is_speech, np.arange(n_frames), -1))
+    carries = [None] + [
+        (_frame_at(y, last_speech[k - 1], hop), noise_psd[last_speech[k - 1]])
+        if last_speech[k - 1] >= 0 else None for k in starts[1:]
+    ]
+
+    args = (segments, [noise_psd[k:k + CHUNK_FRAMES] for k in starts],
+            [is_speech[k:k + CHUNK_FRAMES] for k in starts], carries,
+            repeat(frame_len), repeat(lpc_order), repeat(iterations))
+    # no pool for short signals, nor inside a worker process (batch.py)
+    if (len(segments) == 1 or workers == 1
+            or multiprocessing.parent_process() is not None):
+        chunks = map(_denoise_chunk, *args)
+        return _overlap_add(out, starts, chunks, hop, n_frames)
+    with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+        chunks = pool.map(_denoise_chunk, *args)
+        return _overlap_add(out, starts, chunks, hop, n_frames)
+
+
+def _overlap_add(out: np.ndarray, starts, chunks, hop: int, n_frames: int):
+    end = n_frames * hop
+    for k, chunk in zip(starts, chunks):
+        lo = k * hop
+        hi = min(lo + len(chunk), end)
+        out[lo:hi] += chunk[:hi - lo]
+    return out
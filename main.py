@@ -1,4 +1,3 @@
-import pandas as pd
 import streamlit as st
 
 import components as C
@@ -6,55 +5,67 @@ import utils
 
 if __name__ == "__main__":
     st.title("Audio Checking Tool")
+    utils.instrument.begin_run()
 
     base_folder = st.text_input("specify directory which contains audio file")
-    tp = pd.read_csv("../input/train_tp.csv")
-    fp = pd.read_csv("../input/train_fp.csv")
-    st.dataframe(tp)
+    tp = utils.load_annotation_index(
+        "../input/train_tp.csv", key="recording_id", onset="t_min",
+        offset="t_max")
+    fp = utils.load_annotation_index(
+        "../input/train_fp.csv", key="recording_id", onset="t_min",
+        offset="t_max")
+    # the label tables are memory-mapped; only show their first rows
+    st.text(f"tp: {len(tp)} rows, fp: {len(fp)} rows")
+    st.dataframe(tp.head())
     path = utils.check_folder(base_folder)
+    audio_file_name = None
     if path is not None:
-        audio_files = sorted([
-            f.name
-            for f in (list(path.glob("*.wav")) + list(path.glob("*.mp3")) +
-                      list(path.glob("*.flac")))
-        ])
-        audio_file_name = st.selectbox(
-            "Choose audio file", options=audio_files)
+        audio_file_name = C.select_audio_file(path)
+    if audio_file_name is not None:
         audio_id = audio_file_name.replace(".flac", "")
-        tp_in_audio = tp.query(f"recording_id == '{audio_id}'").reset_index()
-        fp_in_audio = fp.query(f"recording_id == '{audio_id}'").reset_index()
+        tp_in_audio = tp.lookup(audio_id).reset_index()
+        fp_in_audio = fp.lookup(audio_id).reset_index()
 
         st.text("tp")
         st.dataframe(tp_in_audio)
         st.text("fp")
         st.dataframe(fp_in_audio)
 
+        if st.sidebar.button("Index audio info in this folder"):
+            with st.spinner("Reading audio headers"):
+                infos = utils.index_audio_info(path)
+            st.sidebar.text(f"Indexed {len(infos)} files")
+
         audio_path = path / audio_file_name
         audio_info = utils.check_audio_info(audio_path)
 
         C.write_audio_info_to_sidebar(audio_path, audio_info)
         second = C.set_start_second(max_value=audio_info["duration"])
         sr = C.set_sampling_rate(audio_info["sample_rate"])
+        quality = C.set_resampling_quality()
 
         options = st.sidebar.selectbox(
             "Audio option",
             options=["normal", "preprocessing", "augmentations"])
         utils.display_media_audio(audio_path, second)
+        compress = st.sidebar.checkbox("Compress processed audio (FLAC)")
 
         annotation = st.sidebar.file_uploader(
             "Upload annotation file if exist")
         if annotation is not None:
-            event_level_annotation = utils.read_csv(annotation)
+            event_level_annotation = utils.read_annotation(annotation)
         else:
             event_level_annotation = None
 
-        y = utils.read_audio(audio_path, audio_info, sr=sr)
         if options == "preprocessing":
-            y_processed = C.preprocess_on_wave(
-                y, sr=sr, audio_path=str(audio_path))
+            y = utils.read_audio(
+                audio_path, audio_info, sr=sr, quality=quality)
+            y_processed = C.preprocess_on_wave(y, sr=sr)
             if y_processed is not None:
                 st.text("Processed audio")
-                utils.display_media_audio_from_ndarray(y_processed, sr)
+                utils.display_media_audio_from_ndarray(
+                    y_processed, sr, start_second=second, compress=compress)
+                C.prefetch_envelopes(y, y_processed)
                 if event_level_annotation is None:
                     C.waveplot(y, sr, y_processed)
                     C.specshow(y, sr, y_processed)
@@ -64,11 +75,15 @@ if __name__ == "__main__":
                     C.specshow_with_annotation(y, sr, event_level_annotation,
                                                audio_file_name, y_processed)
         elif options == "augmentations":
+            y = utils.read_audio(
+                audio_path, audio_info, sr=sr, quality=quality)
             y_processed = C.augmentations_on_wave(
                 y, sr=sr)
             if y_processed is not None:
                 st.text("Processed audio")
-                utils.display_media_audio_from_ndarray(y_processed, sr)
+                utils.display_media_audio_from_ndarray(
+                    y_processed, sr, start_second=second, compress=compress)
+                C.prefetch_envelopes(y, y_processed)
                 if event_level_annotation is None:
                     C.waveplot(y, sr, y_processed)
                     C.specshow(y, sr, y_processed)
@@ -78,19 +93,42 @@ if __name__ == "__main__":
                     C.specshow_with_annotation(y, sr, event_level_annotation,
                                                audio_file_name, y_processed)
         else:
+            # only the window selected in the plot settings gets decoded
             if event_level_annotation is None:
-                C.waveplot(y, sr, tp=tp_in_audio, fp=fp_in_audio)
-                C.specshow(y, sr, tp=tp_in_audio, fp=fp_in_audio)
+                C.waveplot(
+                    None,
+                    sr,
+                    tp=tp_in_audio,
+                    fp=fp_in_audio,
+                    path=audio_path,
+                    info=audio_info,
+                    quality=quality)
+                C.specshow(
+                    None,
+                    sr,
+                    tp=tp_in_audio,
+                    fp=fp_in_audio,
+                    path=audio_path,
+                    info=audio_info,
+                    quality=quality)
             else:
                 C.waveplot_with_annotation(
-                    y,
+                    None,
                     sr,
                     event_level_annotation,
                     audio_file_name,
-                    processed=None)
+                    processed=None,
+                    path=audio_path,
+                    info=audio_info,
+                    quality=quality)
                 C.specshow_with_annotation(
-                    y,
+                    None,
                     sr,
                     event_level_annotation,
                     audio_file_name,
-                    y_processed=None)
+                    y_processed=None,
+                    path=audio_path,
+                    info=audio_info,
+                    quality=quality)
+
+    C.write_profile_to_sidebar(utils.instrument.end_run())
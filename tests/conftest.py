@@ -0,0 +1,15 @@
+"""
+Shared setup of the regression tests.
+
+Caches of the app are kept in a temporary directory, as in the benchmark
+suite, and the repository root is put on the import path.
+"""
+import os
+import sys
+import tempfile
+
+from pathlib import Path
+
+os.environ.setdefault("STREAMLIT_AUDIO_CACHE_DIR",
+                      tempfile.mkdtemp(prefix="streamlit-audio-test-"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,39 @@
+import threading
+import tracemalloc
+
+from utils import instrument
+
+
+def test_concurrent_runs_write_sinks(monkeypatch, tmp_path):
+    prometheus = tmp_path / "stages.prom"
+    jsonl = tmp_path / "stages.jsonl"
+    monkeypatch.setattr(instrument, "ENABLED", True)
+    monkeypatch.setattr(instrument, "PROMETHEUS_PATH", str(prometheus))
+    monkeypatch.setattr(instrument, "JSONL_PATH", str(jsonl))
+    errors = []
+
+    def session():
+        # sessions are threads of one process
+        for _ in range(50):
+            try:
+                instrument.begin_run()
+                with instrument.stage("concurrent"):
+                    pass
+                assert len(instrument.end_run()) == 1
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=session) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    tracemalloc.stop()
+
+    assert errors == []
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "stages.jsonl", "stages.prom"
+    ]
+    assert len(jsonl.read_text().splitlines()) == 400
+    assert ('streamlit_audio_stage_calls_total{stage="concurrent",cache=""} '
+            '400') in prometheus.read_text()
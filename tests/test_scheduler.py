@@ -0,0 +1,48 @@
+import threading
+import time
+
+from concurrent.futures import Future
+
+from components import scheduler
+
+
+class _DoneExecutor:
+    """Runs jobs inline, so that every future is done when it is returned."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+def _within(seconds, fn):
+    thread = threading.Thread(target=fn, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    return not thread.is_alive()
+
+
+def test_submit_once_with_finished_job(monkeypatch):
+    monkeypatch.setattr(scheduler, "_executor", _DoneExecutor())
+    # a fresh lock, so that a deadlock here does not hang the other tests
+    monkeypatch.setattr(scheduler, "_lock", threading.Lock())
+    results = []
+    assert _within(5, lambda: results.append(
+        scheduler.submit_once("finished", lambda: 42).result()))
+    assert results == [42]
+    assert scheduler.pending("finished") is None
+
+
+def test_submit_once_deduplicates_running_job():
+    release = threading.Event()
+    first = scheduler.submit_once("running", release.wait)
+    second = scheduler.submit_once("running", release.wait)
+    assert first is second
+    assert scheduler.pending("running") is first
+    release.set()
+    first.result()
+    # done callbacks run just after waiters are woken
+    deadline = time.monotonic() + 5
+    while scheduler.pending("running") is not None:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from components import wiener
+
+pra = pytest.importorskip("pyroomacoustics")
+
+
+def noisy_tone(seconds: float, sr: int, seed: int = 0):
+    # a tone switched on and off every half second, so that the signal has
+    # both speech and noise frames
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    tone = 0.5 * np.sin(2 * np.pi * 440 * t) * (np.floor(2 * t) % 2)
+    return tone + 0.05 * rng.standard_normal(len(t))
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"frame_len": 256, "iterations": 3, "alpha": 0.5},
+    {"lpc_order": 10, "iterations": 1, "thresh": 0.002},
+])
+@pytest.mark.parametrize("chunk_frames, workers", [(4096, 1), (16, 1),
+                                                    (16, 2)])
+def test_matches_pyroomacoustics(monkeypatch, params, chunk_frames, workers):
+    # small chunks put chunk boundaries inside noise runs, so that noise
+    # frames reuse the speech PSD carried over from the previous chunk
+    monkeypatch.setattr(wiener, "CHUNK_FRAMES", chunk_frames)
+    y = noisy_tone(2.0, 16000)[:-77]
+    expected = pra.denoise.apply_iterative_wiener(y, **params)
+    actual = wiener.iterative_wiener(y, workers=workers, **params)
+    np.testing.assert_allclose(actual, expected, rtol=0,
+                               atol=1e-9 * np.abs(expected).max())
+
+
+def test_shorter_than_a_hop():
+    assert not wiener.iterative_wiener(np.ones(100)).any()
@@ -1 +1,6 @@
-from .io import check_folder, check_audio_info, display_media_audio, read_audio, display_media_audio_from_ndarray, read_csv
+from .io import check_folder, check_audio_info, index_audio_info, display_media_audio, read_audio, read_native_audio, read_audio_range, AudioFile, display_media_audio_from_ndarray, read_csv, invalidate_audio_cache
+from .catalog import count_audio_files, list_audio_files
+from .annotations import AnnotationIndex, load_annotation_index, read_annotation
+from .signal import Signal, as_float32, derive, fingerprint, peak_abs
+from .resample import RESAMPLING_QUALITIES
+from . import instrument
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from pathlib import Path
+
+from .cache import CACHE_DIR
+from .io import read_csv
+from .signal import digest
+
+ANNOTATION_DIR = CACHE_DIR / "annotations"
+# bump when the on-disk layout changes
+STORE_VERSION = 1
+
+
+def convert_annotations(frame: pd.DataFrame, root: Path, key: str, onset: str,
+                        offset: str):
+    """
+    Write ``frame`` as a columnar store under ``root``: one ``.npy`` per
+    column, sorted by (key, onset) so that the rows of one recording are
+    contiguous, plus ``bounds.npy`` with the first row of every recording.
+    The key and all non-numeric columns are stored as int32 codes with a
+    separate categories array.
+    """
+    keys = frame[key].astype(str).astype("category")
+    codes = keys.cat.codes.values
+    order = np.lexsort((frame[onset].values, codes))
+
+    # sessions are threads of one process, so each conversion needs its own
+    # temporary directory
+    root.parent.mkdir(parents=True, exist_ok=True)
+    tmp_root = Path(tempfile.mkdtemp(prefix=f"{root.name}.", dir=root.parent))
+    columns = []
+    for name in frame.columns:
+        if name == key:
+            column = keys.iloc[order]
+        elif pd.api.types.is_numeric_dtype(frame[name]):
+            np.save(tmp_root / f"{name}.npy", frame[name].values[order])
+            columns.append({"name": name, "categorical": False})
+            continue
+        else:
+            column = frame[name].iloc[order].astype("category")
+        np.save(tmp_root / f"{name}.codes.npy",
+                column.cat.codes.values.astype(np.int32))
+        np.save(tmp_root / f"{name}.categories.npy",
+                np.asarray(column.cat.categories.astype(str), dtype=str))
+        columns.append({"name": name, "categorical": True})
+    n_keys = len(keys.cat.categories)
+    np.save(tmp_root / "bounds.npy",
+            np.searchsorted(codes[order], np.arange(n_keys + 1)))
+    with open(tmp_root / "meta.json", "w") as f:
+        json.dump({
+            "version": STORE_VERSION,
+            "rows": len(frame),
+            "key": key,
+            "onset": onset,
+            "offset": offset,
+            "columns": columns
+        }, f)
+
+    try:
+        os.rename(tmp_root, root)
+    except OSError:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+        # fine if another session converted the same table meanwhile
+        if not (root / "meta.json").exists():
+            raise
+
+
+class AnnotationIndex:
+    """
+    Event table stored by ``convert_annotations``, with every column
+    memory-mapped so that only the rows that are asked for are read.
+
+    ``lookup`` returns the rows of one key, ``in_window`` the rows of one
+    key whose events lie inside ``[start, end]``; both are found by binary
+    search on the per-key offset table and the sorted onsets.
+    """
+
+    def __init__(self, root: Path):
+        with open(Path(root) / "meta.json") as f:
+            meta = json.load(f)
+        self.root = Path(root)
+        self.key = meta["key"]
+        self.onset = meta["onset"]
+        self.offset = meta["offset"]
+        self.n_rows = meta["rows"]
+        self.columns = {}
+        for column in meta["columns"]:
+            name = column["name"]
+            if column["categorical"]:
+                self.columns[name] = (
+                    np.load(self.root / f"{name}.codes.npy", mmap_mode="r"),
+                    np.load(self.root / f"{name}.categories.npy"))
+            else:
+                self.columns[name] = np.load(
+                    self.root / f"{name}.npy", mmap_mode="r")
+        self.categories = self.columns[self.key][1]
+        self.bounds = np.load(self.root / "bounds.npy")
+        self.onsets = self.columns[self.onset]
+        self.offsets = self.columns[self.offset]
+
+    def __len__(self):
+        return self.n_rows
+
+    def _range(self, key: str):
+        i = np.searchsorted(self.categories, key)
+        if i == len(self.categories) or self.categories[i] != key:
+            return 0, 0
+        return self.bounds[i], self.bounds[i + 1]
+
+    def rows(self, lo: int, hi: int) -> pd.DataFrame:
+        data = {}
+        for name, column in self.columns.items():
+            if isinstance(column, tuple):
+                codes, categories = column
+                data[name] = pd.Categorical.from_codes(
+                    np.asarray(codes[lo:hi]), categories)
+            else:
+                data[name] = np.asarray(column[lo:hi])
+        return pd.DataFrame(data, index=pd.RangeIndex(lo, hi))
+
+    def head(self, n: int = 1000) -> pd.DataFrame:
+        return self.rows(0, min(n, len(self)))
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        # the whole table; prefer lookup / in_window on large tables
+        return self.rows(0, len(self))
+
+    def lookup(self, key: str) -> pd.DataFrame:
+        lo, hi = self._range(key)
+        return self.rows(lo, hi)
+
+    def in_window(self, key: str, start: float, end: float) -> pd.DataFrame:
+        lo, hi = self._range(key)
+        first = lo + np.searchsorted(self.onsets[lo:hi], start, side="left")
+        last = lo + np.searchsorted(self.onsets[lo:hi], end, side="right")
+        inside = np.asarray(self.offsets[first:last]) <= end
+        return self.rows(first, last)[inside]
+
+
+def _open_store(store_key: str, key: str, onset: str, offset: str, parse):
+    root = ANNOTATION_DIR / digest(store_key, key, onset, offset,
+                                   STORE_VERSION)
+    if not (root / "meta.json").exists():
+        convert_annotations(parse(), root, key, onset, offset)
+    return AnnotationIndex(root)
+
+
+@st.cache(allow_output_mutation=True)
+def _load_annotation_index(path: str, mtime_ns: int, size: int, key: str,
+                           onset: str, offset: str):
+    store_key = digest(str(Path(path).resolve()), mtime_ns, size)
+    return _open_store(
+        store_key, key, onset, offset,
+        lambda: pd.read_csv(path, dtype={key: "category"}))
+
+
+def load_annotation_index(path: str, key: str, onset: str, offset: str):
+    """
+    Convert an annotation CSV once (and again only if the file changes)
+    into a memory-mapped ``AnnotationIndex``.
+    """
+    stat = os.stat(path)
+    return _load_annotation_index(path, stat.st_mtime_ns, stat.st_size, key,
+                                  onset, offset)
+
+
+@st.cache(allow_output_mutation=True)
+def read_annotation(uploaded_file):
+    # uploads have no path to key on, so the store is keyed by content;
+    # streamlit hands textual files over as StringIO
+    value = uploaded_file.getvalue()
+    if isinstance(value, str):
+        value = value.encode()
+    content = hashlib.blake2b(value, digest_size=16).hexdigest()
+    return _open_store(content, "filename", "onset", "offset",
+                       lambda: read_csv(uploaded_file))
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+from pathlib import Path
+from typing import Optional
+
+CACHE_DIR = Path(
+    os.environ.get("STREAMLIT_AUDIO_CACHE_DIR",
+                   Path.home() / ".cache" / "streamlit-audio"))
+MAX_CACHE_BYTES = int(
+    os.environ.get("STREAMLIT_AUDIO_CACHE_MAX_BYTES", 20 * 1024**3))
+
+
+class DecodeCache:
+    """
+    On-disk cache of decoded float32 PCM.
+
+    Entries live under ``root/<digest of path>/<mtime>_<size>_<sr>.npy`` so
+    that a modified file never hits a stale entry and all entries of one file
+    can be dropped at once. Hits are opened with ``mmap_mode="r"``; the
+    entry's mtime is bumped on every hit and used as the LRU clock.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _file_dir(self, path: Path) -> Path:
+        digest = hashlib.sha1(str(Path(path).resolve()).encode()).hexdigest()
+        return self.root / digest
+
+    def _entry(self, path: Path, sr) -> Path:
+        stat = os.stat(path)
+        name = f"{stat.st_mtime_ns}_{stat.st_size}_{sr}.npy"
+        return self._file_dir(path) / name
+
+    def get(self, path: Path, sr) -> Optional[np.ndarray]:
+        entry = self._entry(path, sr)
+        if not entry.exists():
+            return None
+        try:
+            y = np.load(entry, mmap_mode="r")
+            os.utime(entry)
+        except (OSError, ValueError):
+            _unlink(entry)
+            return None
+        return y
+
+    def put(self, path: Path, sr, y: np.ndarray) -> np.ndarray:
+        entry = self._entry(path, sr)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        stat_prefix = "_".join(entry.name.split("_")[:2]) + "_"
+        for sibling in entry.parent.glob("*.npy"):
+            if not sibling.name.startswith(stat_prefix):
+                _unlink(sibling)
+
+        # sessions are threads of one process, so the temporary file needs a
+        # name of its own, not just the PID
+        fd, tmp = tempfile.mkstemp(
+            prefix=f"{entry.name}.", suffix=".tmp", dir=entry.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.ascontiguousarray(y, dtype=np.float32))
+            os.replace(tmp, entry)
+        except FileNotFoundError:
+            # the file's entries were invalidated meanwhile; serve from memory
+            _unlink(Path(tmp))
+            return np.ascontiguousarray(y, dtype=np.float32)
+
+        self.evict(keep=entry)
+        try:
+            return np.load(entry, mmap_mode="r")
+        except FileNotFoundError:
+            return np.ascontiguousarray(y, dtype=np.float32)
+
+    def evict(self, keep: Optional[Path] = None):
+        with self._lock:
+            entries = []
+            for entry in self.root.glob("*/*.npy"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                if entry == keep:
+                    continue
+                _unlink(entry)
+                total -= size
+
+    def invalidate(self, path: Path):
+        shutil.rmtree(self._file_dir(path), ignore_errors=True)
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def _unlink(path: Path):
+    # another session may have removed it already
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+decode_cache = DecodeCache(CACHE_DIR / "pcm", MAX_CACHE_BYTES)
@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from . import instrument
+from .cache import CACHE_DIR
+
+CATALOG_DB = CACHE_DIR / "catalog.sqlite"
+AUDIO_EXTENSIONS = ("wav", "mp3", "flac")
+
+# upper bound for prefix range queries; sorts after any valid UTF-8 string
+_PREFIX_END = "\U0010ffff"
+
+
+def _connect():
+    CATALOG_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(CATALOG_DB), timeout=30)
+    conn.execute("CREATE TABLE IF NOT EXISTS dirs ("
+                 "path TEXT PRIMARY KEY, mtime_ns INTEGER, subdirs TEXT)")
+    conn.execute("CREATE TABLE IF NOT EXISTS files ("
+                 "dir TEXT, name TEXT, ext TEXT, PRIMARY KEY (dir, name))")
+    return conn
+
+
+def _key(folder: Path) -> str:
+    return str(Path(folder).resolve())
+
+
+@instrument.timed("catalog.refresh")
+def refresh(folder: Path):
+    """
+    Rescan ``folder`` with a single ``os.scandir`` pass if its mtime differs
+    from the catalogued one. Adding, removing or renaming an entry bumps
+    the directory mtime, so an unchanged mtime means an unchanged listing.
+    """
+    key = _key(folder)
+    mtime_ns = os.stat(key).st_mtime_ns
+    with _connect() as conn:
+        row = conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?",
+                           (key, )).fetchone()
+        if row is not None and row[0] == mtime_ns:
+            return
+
+        files = []
+        subdirs = []
+        with os.scandir(key) as it:
+            for entry in it:
+                if entry.is_dir():
+                    subdirs.append(entry.name)
+                    continue
+                ext = entry.name.rsplit(".", 1)[-1]
+                if ext in AUDIO_EXTENSIONS and entry.is_file():
+                    files.append((key, entry.name, ext))
+
+        conn.execute("DELETE FROM files WHERE dir = ?", (key, ))
+        conn.executemany("INSERT INTO files VALUES (?, ?, ?)", files)
+        conn.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)",
+                     (key, mtime_ns, json.dumps(sorted(subdirs))))
+
+
+def list_subdirs(folder: Path) -> List[str]:
+    refresh(folder)
+    with _connect() as conn:
+        row = conn.execute("SELECT subdirs FROM dirs WHERE path = ?",
+                           (_key(folder), )).fetchone()
+    return json.loads(row[0])
+
+
+def count_by_extension(folder: Path) -> Dict[str, int]:
+    refresh(folder)
+    counts = {ext: 0 for ext in AUDIO_EXTENSIONS}
+    with _connect() as conn:
+        for ext, n in conn.execute(
+                "SELECT ext, COUNT(*) FROM files WHERE dir = ? GROUP BY ext",
+            (_key(folder), )):
+            counts[ext] = n
+    return counts
+
+
+def count_audio_files(folder: Path, prefix: str = "") -> int:
+    refresh(folder)
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT COUNT(*) FROM files "
+            "WHERE dir = ? AND name >= ? AND name < ?",
+            (_key(folder), prefix, prefix + _PREFIX_END)).fetchone()
+    return row[0]
+
+
+def list_audio_files(folder: Path,
+                     prefix: str = "",
+                     limit: Optional[int] = None,
+                     offset: int = 0) -> List[str]:
+    """
+    Sorted audio file names in ``folder`` starting with ``prefix``, one page
+    of ``limit`` names at a time.
+    """
+    refresh(folder)
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT name FROM files "
+            "WHERE dir = ? AND name >= ? AND name < ? "
+            "ORDER BY name LIMIT ? OFFSET ?",
+            (_key(folder), prefix, prefix + _PREFIX_END,
+             -1 if limit is None else limit, offset)).fetchall()
+    return [row[0] for row in rows]
+
+
+def discover_audio_files(folder: Path) -> List[Path]:
+    """
+    Audio files reachable from ``folder`` under the rules of
+    ``utils.check_folder``: a folder that holds audio files is used as is,
+    otherwise its subfolders are searched, recursively.
+    """
+    names = list_audio_files(folder)
+    if names:
+        return [Path(folder) / name for name in names]
+    paths = []  # type: List[Path]
+    for subdir in list_subdirs(folder):
+        paths.extend(discover_audio_files(Path(folder) / subdir))
+    return paths
@@ -0,0 +1,273 @@
+import functools
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import List, Optional
+
+# instrumentation is off unless STREAMLIT_AUDIO_PROFILE is set; decorators
+# then return the function itself and stage() a shared no-op context
+ENABLED = os.environ.get("STREAMLIT_AUDIO_PROFILE", "") not in ("", "0")
+JSONL_PATH = os.environ.get("STREAMLIT_AUDIO_PROFILE_JSONL")
+PROMETHEUS_PATH = os.environ.get("STREAMLIT_AUDIO_PROFILE_PROM")
+# debug mode: copy_budget() blocks raise if they allocate more full-length
+# buffers than they declare
+DEBUG_COPIES = os.environ.get("STREAMLIT_AUDIO_DEBUG_COPIES",
+                              "") not in ("", "0")
+# allowance for block-sized scratch buffers and interpreter overhead
+COPY_SLACK_BYTES = 32 * 1024**2
+
+_local = threading.local()
+_lock = threading.Lock()
+# serializes writes to the JSONL and Prometheus sinks
+_sink_lock = threading.Lock()
+# records per script run; Streamlit sessions run concurrently, each on its
+# own thread, which holds its current run id in _local.run
+_runs = OrderedDict()  # type: OrderedDict
+_run_ids = itertools.count(1)
+# runs that never reached end_run (interrupted reruns) are dropped past this
+MAX_OPEN_RUNS = 64
+# cumulative per (stage, cache) totals for the Prometheus textfile
+_totals = defaultdict(lambda: [0, 0.0])  # type: ignore
+
+
+class _NullStage:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, name: str, cached: bool):
+        self.record = {"stage": name, "cache": "hit" if cached else None}
+
+    def __enter__(self):
+        stack = _stack()
+        self.record["depth"] = len(stack)
+        stack.append(self.record)
+        self.start_bytes = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        self.record["seconds"] = seconds
+        self.record["bytes"] = (tracemalloc.get_traced_memory()[0] -
+                                self.start_bytes)
+        self.record["thread"] = threading.current_thread().name
+        _stack().pop()
+        run = getattr(_local, "run", None)
+        with _lock:
+            # stages outside a run, or finishing after it ended, are dropped
+            if run in _runs:
+                self.record["run"] = run
+                _runs[run].append(self.record)
+        return False
+
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def stage(name: str, cached: bool = False):
+    """
+    Context manager recording the wall time and the net traced memory of its
+    block under ``name``. With ``cached=True`` the stage counts as a cache
+    hit unless ``mark_miss`` is called inside it.
+    """
+    if not ENABLED:
+        return _NULL_STAGE
+    return _Stage(name, cached)
+
+
+def timed(name: Optional[str] = None, cached: bool = False):
+    """
+    Decorator version of ``stage``. Put it above ``st.cache`` and call
+    ``mark_miss`` in the function body to tell hits from misses.
+    """
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+        stage_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Stage(stage_name, cached):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class _CopyBudget:
+    def __init__(self, nbytes: int, copies: int, name: str):
+        self.limit = copies * nbytes + COPY_SLACK_BYTES
+        self.nbytes = nbytes
+        self.copies = copies
+        self.name = name
+
+    def __enter__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        stack = _budget_stack()
+        if stack:
+            # resetting the peak below would hide the outer block's peak so
+            # far, so hand it over first
+            stack[-1].peak = max(stack[-1].peak,
+                                 tracemalloc.get_traced_memory()[1])
+        stack.append(self)
+        self.start, _ = tracemalloc.get_traced_memory()
+        self.peak = self.start
+        tracemalloc.reset_peak()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        stack = _budget_stack()
+        stack.pop()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, peak)
+        allocated = peak - self.start
+        if exc_type is None and allocated > self.limit:
+            raise AssertionError(
+                f"{self.name} allocated {allocated / self.nbytes:.1f} "
+                f"signal lengths, expected at most {self.copies}")
+        return False
+
+
+def _budget_stack() -> list:
+    stack = getattr(_local, "budgets", None)
+    if stack is None:
+        stack = _local.budgets = []
+    return stack
+
+
+def copy_budget(y, copies: Optional[int], name: str):
+    """
+    Context manager asserting, in debug mode, that its block allocates at
+    most ``copies`` buffers as large as ``y`` at any one time. A no-op when
+    debug mode is off or ``copies`` is None.
+    """
+    if not DEBUG_COPIES or copies is None:
+        return _NULL_STAGE
+    return _CopyBudget(y.nbytes, copies, name)
+
+
+def mark_miss():
+    if ENABLED:
+        stack = _stack()
+        if stack:
+            stack[-1]["cache"] = "miss"
+
+
+def bind(fn):
+    """
+    Wrap ``fn`` so that the stages it records on another thread (e.g. the
+    compute pool) count towards the calling thread's run.
+    """
+    if not ENABLED:
+        return fn
+    run = getattr(_local, "run", None)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, "run", None)
+        _local.run = run
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.run = previous
+
+    return wrapper
+
+
+def begin_run():
+    """Start collecting the records of a new script run on this thread."""
+    if not ENABLED:
+        return
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    run = next(_run_ids)
+    with _lock:
+        _runs.pop(getattr(_local, "run", None), None)
+        _runs[run] = []
+        while len(_runs) > MAX_OPEN_RUNS:
+            _runs.popitem(last=False)
+    _local.run = run
+
+
+def end_run() -> List[dict]:
+    """Write the records of this run to the configured sinks and return them."""
+    if not ENABLED:
+        return []
+    run = getattr(_local, "run", None)
+    _local.run = None
+    with _lock:
+        records = _runs.pop(run, [])
+        for record in records:
+            total = _totals[(record["stage"], record["cache"])]
+            total[0] += 1
+            total[1] += record["seconds"]
+    # concurrent sessions end their runs on their own threads; the totals
+    # are read under the sink lock so that the textfile never goes back
+    with _sink_lock:
+        if JSONL_PATH:
+            _write_jsonl(records)
+        if PROMETHEUS_PATH:
+            with _lock:
+                totals = {key: tuple(total) for key, total in _totals.items()}
+            _write_prometheus(totals)
+    return records
+
+
+def _write_jsonl(records: List[dict]):
+    now = time.time()
+    with open(JSONL_PATH, "a") as f:
+        for record in records:
+            f.write(json.dumps(dict(record, time=now)) + "\n")
+
+
+def _write_prometheus(totals: dict):
+    lines = [
+        "# HELP streamlit_audio_stage_calls_total Calls of an instrumented stage.",
+        "# TYPE streamlit_audio_stage_calls_total counter",
+    ]
+    for (name, cache), (calls, _) in sorted(totals.items(), key=str):
+        lines.append(f'streamlit_audio_stage_calls_total{{stage="{name}",'
+                     f'cache="{cache or ""}"}} {calls}')
+    lines += [
+        "# HELP streamlit_audio_stage_seconds_total Wall time spent in a stage.",
+        "# TYPE streamlit_audio_stage_seconds_total counter",
+    ]
+    for (name, cache), (_, seconds) in sorted(totals.items(), key=str):
+        lines.append(f'streamlit_audio_stage_seconds_total{{stage="{name}",'
+                     f'cache="{cache or ""}"}} {seconds:.6f}')
+    # node_exporter may read the file at any time, so replace it atomically
+    path = Path(PROMETHEUS_PATH)
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{path.name}.", suffix=".tmp",
+                                    dir=path.parent)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
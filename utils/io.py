@@ -1,17 +1,22 @@
-import audioread
 import io
-import tempfile
+import os
 import struct
-import wave
 
 import librosa
 import numpy as np
 import pandas as pd
+import soundfile as sf
 import streamlit as st
 
 from pathlib import Path
 from typing import Optional
 
+from . import catalog, instrument
+from .cache import decode_cache
+from .signal import Signal, digest, peak_abs
+from .probe import lookup_audio_info, probe_audio_info, probe_folder, store_audio_info
+from .resample import resample, resampled
+
 
 @st.cache
 def read_csv(uploaded_file):
@@ -19,12 +24,131 @@ def read_csv(uploaded_file):
     return df
 
 
-@st.cache
-def read_audio(path: Path, info: dict, sr: Optional[int] = None):
+@instrument.timed("read_native_audio", cached=True)
+@st.cache(allow_output_mutation=True)
+def read_native_audio(path: Path, info: dict):
+    """
+    Decode ``path`` once at its native sampling rate; every other rate is
+    resampled from this signal.
+    """
+    instrument.mark_miss()
+    native_sr = info["sample_rate"]
+    y = decode_cache.get(path, native_sr)
+    if y is None:
+        y, native_sr = librosa.load(path, sr=None, mono=True)
+        y = decode_cache.put(path, native_sr, y)
+    return Signal(y, _audio_key(path, native_sr)), native_sr
+
+
+def read_audio(path: Path,
+               info: dict,
+               sr: Optional[int] = None,
+               quality: str = "polyphase"):
+    y, native_sr = read_native_audio(path, info)
+    if sr is None:
+        return y
+    return resampled(y, native_sr, sr, quality)
+
+
+def _audio_key(path: Path, sr: int, *parts):
+    stat = os.stat(path)
+    return digest(
+        str(Path(path).resolve()), stat.st_mtime_ns, stat.st_size, sr, *parts)
+
+
+def _read_native_range(path: Path, info: dict, lo: float, hi: float):
+    native_sr = info["sample_rate"]
+    y = decode_cache.get(path, native_sr)
+    if y is not None:
+        return y[int(round(lo * native_sr)):int(round(hi * native_sr))], \
+            native_sr
+    if path.suffix.lower() in {".wav", ".flac"}:
+        with sf.SoundFile(str(path)) as f:
+            native_sr = f.samplerate
+            f.seek(int(round(lo * native_sr)))
+            y = f.read(
+                int(round((hi - lo) * native_sr)),
+                dtype="float32",
+                always_2d=True)
+        # mono files need no downmix, and the column is a view
+        if y.shape[1] == 1:
+            return y[:, 0], native_sr
+        return y.mean(axis=1, dtype=np.float32), native_sr
+    return librosa.load(
+        path, sr=None, mono=True, offset=lo, duration=hi - lo)
+
+
+def _read_range(path: Path, info: dict, start_index: int, end_index: int,
+                sr: int, quality: str, margin: float):
+    # read the range plus a margin at the native rate so that resampling
+    # has context at both edges, then trim back to the requested range
+    lo = max(0.0, start_index / sr - margin)
+    hi = min(info["duration"], end_index / sr + margin)
+    y, native_sr = _read_native_range(path, info, lo, hi)
+    y = resample(y, native_sr, sr, quality)
+    head = start_index - int(round(lo * sr))
+    return y[head:head + end_index - start_index]
+
+
+@instrument.timed("read_audio_range", cached=True)
+@st.cache(allow_output_mutation=True)
+def read_audio_range(path: Path,
+                     info: dict,
+                     start_second: float,
+                     end_second: float,
+                     sr: Optional[int] = None,
+                     quality: str = "polyphase",
+                     margin: float = 0.5):
+    instrument.mark_miss()
     if sr is None:
         sr = info["sample_rate"]
-    y, _ = librosa.load(path, sr=sr, mono=True, res_type="kaiser_fast")
-    return y
+    start_index = int(round(start_second * sr))
+    end_index = int(round(end_second * sr))
+    y = _read_range(path, info, start_index, end_index, sr, quality, margin)
+    key = _audio_key(path, sr, quality, start_index, end_index)
+    return Signal(y, key)
+
+
+class AudioFile:
+    """
+    The samples of ``path`` at ``sr``, read only where they are sliced.
+
+    ``key`` identifies the file, rate and resampler, so that features
+    computed from ranges of it are cached across windows. The length
+    comes from the probed duration; reads past the decoded end are zero.
+    """
+
+    def __init__(self,
+                 path: Path,
+                 info: dict,
+                 sr: int,
+                 quality: str = "polyphase",
+                 margin: float = 0.5):
+        self.path = path
+        self.info = info
+        self.sr = sr
+        self.quality = quality
+        self.margin = margin
+        self.key = _audio_key(path, sr, quality)
+        self.n_samples = int(round(info["duration"] * sr))
+
+    def __len__(self):
+        return self.n_samples
+
+    def __getitem__(self, index: slice) -> np.ndarray:
+        start, stop, step = index.indices(len(self))
+        if step != 1:
+            raise IndexError("AudioFile only supports contiguous slices")
+        n = max(stop - start, 0)
+        y = _read_range(self.path, self.info, start, start + n, self.sr,
+                        self.quality, self.margin)
+        if len(y) < n:
+            y = np.pad(y, (0, n - len(y)))
+        return y
+
+
+def invalidate_audio_cache(path: Path):
+    decode_cache.invalidate(path)
 
 
 @st.cache
@@ -35,32 +159,68 @@ def read_audio_bytes(path: Path):
     return audio_bytes
 
 
+@instrument.timed("check_audio_info", cached=True)
 @st.cache
 def check_audio_info(path: Path):
-    path_ = str(path)
-    with audioread.audio_open(path_) as f:
-        sr = f.samplerate
-        ch = f.channels
-        dur = f.duration
+    instrument.mark_miss()
+    info = lookup_audio_info(path)
+    if info is None:
+        info = probe_audio_info(path)
+        store_audio_info({path: info})
+    return info
 
-    return {"sample_rate": sr, "channels": ch, "duration": dur}
 
+@instrument.timed("index_audio_info", cached=True)
+@st.cache(allow_output_mutation=True)
+def index_audio_info(folder: Path):
+    instrument.mark_miss()
+    return probe_folder(folder)
 
-def display_media_audio_from_ndarray(y: np.ndarray, sr: int):
-    max_num = 32767.0 / y.max()
-    y_hex = (y * max_num).astype(np.int16)
-    binary_wave = struct.pack("h" * len(y_hex), *(y_hex.tolist()))
 
-    with tempfile.TemporaryFile() as fp:
-        w = wave.Wave_write(fp)  # type: ignore
-        params = (1, 2, sr, len(binary_wave), "NONE", "not compressed")
-        w.setparams(params)  # type: ignore
-        w.writeframes(binary_wave)
-        w.close()
-        fp.seek(0)
-        bytesio = io.BytesIO(fp.read())
+def _to_pcm16(y: np.ndarray, out: np.ndarray, chunk_size: int = 1 << 16):
+    peak = float(peak_abs(y))
+    scale = 32767.0 / peak if peak > 0 else 0.0
+    # scale and clip through a small scratch buffer instead of full-length
+    # float temporaries
+    scratch = np.empty(min(chunk_size, len(y)), dtype=np.float32)
+    for start in range(0, len(y), chunk_size):
+        chunk = y[start:start + chunk_size]
+        tmp = scratch[:len(chunk)]
+        np.multiply(chunk, scale, out=tmp, casting="unsafe")
+        np.clip(tmp, -32768, 32767, out=tmp)
+        out[start:start + len(chunk)] = tmp
+    return out
 
-    st.audio(bytesio)
+
+def encode_wav(y: np.ndarray, sr: int) -> bytes:
+    n_bytes = 2 * len(y)
+    buffer = bytearray(44 + n_bytes)
+    struct.pack_into("<4sI4s4sIHHIIHH4sI", buffer, 0, b"RIFF", 36 + n_bytes,
+                     b"WAVE", b"fmt ", 16, 1, 1, sr, 2 * sr, 2, 16, b"data",
+                     n_bytes)
+    _to_pcm16(y, np.frombuffer(buffer, dtype="<i2", offset=44))
+    return bytes(buffer)
+
+
+def encode_flac(y: np.ndarray, sr: int) -> bytes:
+    pcm = _to_pcm16(y, np.empty(len(y), dtype=np.int16))
+    bytesio = io.BytesIO()
+    sf.write(bytesio, pcm, sr, format="FLAC", subtype="PCM_16")
+    return bytesio.getvalue()
+
+
+def display_media_audio_from_ndarray(y: np.ndarray,
+                                     sr: int,
+                                     start_second: float = 0,
+                                     duration: Optional[float] = None,
+                                     compress: bool = False):
+    start_index = int(start_second * sr)
+    end_index = None if duration is None else start_index + int(duration * sr)
+    y_window = y[start_index:end_index]
+    if compress:
+        st.audio(encode_flac(y_window, sr), format="audio/x-flac")
+    else:
+        st.audio(encode_wav(y_window, sr), format="audio/wav")
 
 
 def display_media_audio(path: Path, start_second: int = 0):
@@ -79,33 +239,29 @@ def display_media_audio(path: Path, start_second: int = 0):
             read_audio_bytes(path), start_time=start_second, format=format_)
 
 
+@instrument.timed("check_folder")
 def check_folder(folder: str):
     path = Path(folder)
     if not path.exists():
         st.warning("specified folder does not exist")
         return
     else:
-        wavs = list(path.glob("*.wav"))
-        mp3s = list(path.glob("*.mp3"))
-        flacs = list(path.glob("*.flac"))
-        subdirs = [
-            subpaths for subpaths in path.glob("*") if subpaths.is_dir()
-        ]
-
-        if len(wavs) > 0:
-            st.success(f"Found {len(wavs)} wav files")
+        counts = catalog.count_by_extension(path)
+        subdir_names = catalog.list_subdirs(path)
+
+        if counts["wav"] > 0:
+            st.success(f"Found {counts['wav']} wav files")
             return path
-        if len(mp3s) > 0:
-            st.success(f"Found {len(mp3s)} mp3 files")
+        if counts["mp3"] > 0:
+            st.success(f"Found {counts['mp3']} mp3 files")
             return path
-        if len(flacs) > 0:
-            st.success(f"Found {len(flacs)} flac files")
+        if counts["flac"] > 0:
+            st.success(f"Found {counts['flac']} flac files")
             return path
-        if len(subdirs) == 0:
+        if len(subdir_names) == 0:
             st.warning("No wav or mp3 found under the directory you specified")
             return
         else:
-            subdir_names = sorted([subdir.name for subdir in subdirs])
             subfolder = st.selectbox(
                 f"Pick one folder below {str(folder)}",
                 options=subdir_names,
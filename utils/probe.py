@@ -0,0 +1,245 @@
+import audioread
+import os
+import sqlite3
+import struct
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from . import catalog
+from .cache import CACHE_DIR
+
+AUDIO_INFO_DB = CACHE_DIR / "audio_info.sqlite"
+
+_MP3_BITRATES = {
+    # (mpeg1, layer) -> kbps by index
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG 1
+    2: [22050, 24000, 16000],  # MPEG 2
+    0: [11025, 12000, 8000],  # MPEG 2.5
+}
+
+
+def _info(sr: int, ch: int, dur: float):
+    return {"sample_rate": sr, "channels": ch, "duration": dur}
+
+
+def _probe_wav(f, size: int):
+    riff = f.read(12)
+    if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        return None
+    block_align = sr = ch = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        chunk_id, chunk_size = struct.unpack("<4sI", header)
+        if chunk_id == b"fmt ":
+            fmt = f.read(chunk_size + chunk_size % 2)
+            ch, sr, _, block_align = struct.unpack("<HIIH", fmt[2:14])
+        elif chunk_id == b"data":
+            if block_align is None or not block_align or not sr:
+                return None
+            # streamed writers leave the size unset; trust the file length
+            chunk_size = min(chunk_size, size - f.tell())
+            return _info(sr, ch, chunk_size // block_align / sr)
+        else:
+            f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+
+def _skip_id3(f):
+    header = f.read(10)
+    if len(header) == 10 and header[:3] == b"ID3":
+        tag_size = 0
+        for b in header[6:10]:
+            tag_size = (tag_size << 7) | (b & 0x7f)
+        footer = 10 if header[5] & 0x10 else 0
+        f.seek(10 + tag_size + footer)
+    else:
+        f.seek(0)
+
+
+def _probe_flac(f, size: int):
+    _skip_id3(f)
+    if f.read(4) != b"fLaC":
+        return None
+    header = f.read(4)
+    if len(header) < 4 or header[0] & 0x7f != 0:
+        return None
+    streaminfo = f.read(34)
+    if len(streaminfo) < 34:
+        return None
+    bits = int.from_bytes(streaminfo[10:18], "big")
+    sr = bits >> 44
+    ch = ((bits >> 41) & 0x7) + 1
+    total_samples = bits & 0xfffffffff
+    if not sr or not total_samples:
+        return None
+    return _info(sr, ch, total_samples / sr)
+
+
+def _probe_mp3(f, size: int):
+    _skip_id3(f)
+    start = f.tell()
+    buf = f.read(64 * 1024)
+    i = 0
+    while i + 4 <= len(buf):
+        if buf[i] == 0xff and buf[i + 1] & 0xe0 == 0xe0:
+            version = (buf[i + 1] >> 3) & 0x3
+            layer = 4 - ((buf[i + 1] >> 1) & 0x3)
+            bitrate_index = buf[i + 2] >> 4
+            sr_index = (buf[i + 2] >> 2) & 0x3
+            if (version != 1 and layer != 4 and bitrate_index not in {0, 15}
+                    and sr_index != 3):
+                break
+        i += 1
+    else:
+        return None
+
+    mpeg1 = version == 3
+    sr = _MP3_SAMPLE_RATES[version][sr_index]
+    mono = buf[i + 3] >> 6 == 3
+    ch = 1 if mono else 2
+    if layer == 1:
+        samples_per_frame = 384
+    elif layer == 3 and not mpeg1:
+        samples_per_frame = 576
+    else:
+        samples_per_frame = 1152
+
+    # VBR files carry the frame count in a Xing/Info or VBRI header
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    xing = i + 4 + side_info
+    if buf[xing:xing + 4] in {b"Xing", b"Info"}:
+        flags = struct.unpack(">I", buf[xing + 4:xing + 8])[0]
+        if flags & 0x1:
+            n_frames = struct.unpack(">I", buf[xing + 8:xing + 12])[0]
+            return _info(sr, ch, n_frames * samples_per_frame / sr)
+    vbri = i + 4 + 32
+    if buf[vbri:vbri + 4] == b"VBRI":
+        n_frames = struct.unpack(">I", buf[vbri + 14:vbri + 18])[0]
+        return _info(sr, ch, n_frames * samples_per_frame / sr)
+
+    bitrate = _MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    audio_bytes = size - (start + i)
+    f.seek(-128, os.SEEK_END)
+    if f.read(3) == b"TAG":
+        audio_bytes -= 128
+    return _info(sr, ch, audio_bytes * 8 / bitrate)
+
+
+_PROBES = {".wav": _probe_wav, ".flac": _probe_flac, ".mp3": _probe_mp3}
+
+
+def _probe_with_audioread(path: Path):
+    with audioread.audio_open(str(path)) as f:
+        return _info(f.samplerate, f.channels, f.duration)
+
+
+def probe_audio_info(path: Path) -> dict:
+    """
+    Read samplerate, channels and duration from the file header, falling
+    back to a decoder backend for files the header parsers don't handle.
+    """
+    probe = _PROBES.get(Path(path).suffix.lower())
+    if probe is not None:
+        try:
+            with open(path, "rb") as f:
+                info = probe(f, os.fstat(f.fileno()).st_size)
+        except (OSError, struct.error, IndexError):
+            info = None
+        if info is not None:
+            return info
+    return _probe_with_audioread(path)
+
+
+def _connect():
+    AUDIO_INFO_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(AUDIO_INFO_DB), timeout=30)
+    conn.execute("CREATE TABLE IF NOT EXISTS audio_info ("
+                 "path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, "
+                 "sample_rate INTEGER, channels INTEGER, duration REAL)")
+    return conn
+
+
+def _stat_key(path: Path):
+    stat = os.stat(path)
+    return str(Path(path).resolve()), stat.st_mtime_ns, stat.st_size
+
+
+def lookup_audio_info(path: Path) -> Optional[dict]:
+    key, mtime_ns, size = _stat_key(path)
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT sample_rate, channels, duration FROM audio_info "
+            "WHERE path = ? AND mtime_ns = ? AND size = ?",
+            (key, mtime_ns, size)).fetchone()
+    if row is None:
+        return None
+    return _info(*row)
+
+
+def store_audio_info(infos: Dict[Path, dict]):
+    rows = []
+    for path, info in infos.items():
+        rows.append(
+            _stat_key(path) + (info["sample_rate"], info["channels"],
+                               info["duration"]))
+    with _connect() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO audio_info VALUES (?, ?, ?, ?, ?, ?)",
+            rows)
+
+
+def probe_files(paths: Iterable[Path], max_workers: int = 8) -> Dict[Path, dict]:
+    """
+    Probe many files on a thread pool, reusing the stored results of files
+    whose mtime and size haven't changed, and store the new ones.
+    """
+    paths = list(paths)
+    keys = [_stat_key(path) for path in paths]
+    with _connect() as conn:
+        known = {
+            (row[0], row[1], row[2]): _info(*row[3:])
+            for row in conn.execute("SELECT * FROM audio_info")
+        }
+
+    infos = {}
+    missing = []
+    for path, key in zip(paths, keys):
+        if key in known:
+            infos[path] = known[key]
+        else:
+            missing.append(path)
+
+    probed = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for path, info in zip(missing, executor.map(_try_probe, missing)):
+            if info is not None:
+                probed[path] = info
+    if probed:
+        store_audio_info(probed)
+    infos.update(probed)
+    return infos
+
+
+def _try_probe(path: Path):
+    try:
+        return probe_audio_info(path)
+    except Exception:
+        return None
+
+
+def probe_folder(folder: Path, max_workers: int = 8) -> Dict[Path, dict]:
+    paths = [
+        Path(folder) / name for name in catalog.list_audio_files(folder)
+    ]
+    return probe_files(paths, max_workers=max_workers)
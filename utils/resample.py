@@ -0,0 +1,59 @@
+import librosa
+import numpy as np
+import streamlit as st
+
+from fractions import Fraction
+from functools import lru_cache
+from scipy import signal as sps
+
+from . import instrument
+from .signal import HASH_FUNCS, derive
+
+# "polyphase" is an exact rational resampler (fast for ratios such as
+# 44100 -> 22050 or 48000 -> 16000); the kaiser ones are librosa's
+RESAMPLING_QUALITIES = ("polyphase", "kaiser_fast", "kaiser_best")
+
+
+def resample(y: np.ndarray,
+             orig_sr: int,
+             target_sr: int,
+             quality: str = "polyphase") -> np.ndarray:
+    if quality not in RESAMPLING_QUALITIES:
+        raise ValueError(f"Unknown resampling quality: {quality}")
+    if orig_sr == target_sr:
+        return y
+    if quality == "polyphase":
+        ratio = Fraction(int(target_sr), int(orig_sr))
+        y_out = sps.resample_poly(
+            y,
+            ratio.numerator,
+            ratio.denominator,
+            window=_polyphase_taps(ratio.numerator, ratio.denominator))
+    else:
+        y_out = librosa.resample(y, orig_sr, target_sr, res_type=quality)
+    return y_out.astype(np.float32, copy=False)
+
+
+@lru_cache(maxsize=32)
+def _polyphase_taps(up: int, down: int) -> np.ndarray:
+    # resample_poly's default anti-aliasing filter, as float32 so that the
+    # output of a float32 signal stays float32 instead of being upcast
+    max_rate = max(up, down)
+    taps = sps.firwin(2 * 10 * max_rate + 1, 1. / max_rate,
+                      window=("kaiser", 5.0))
+    return taps.astype(np.float32)
+
+
+@instrument.timed("resample", cached=True)
+@st.cache(allow_output_mutation=True, hash_funcs=HASH_FUNCS)
+def resampled(y: np.ndarray,
+              orig_sr: int,
+              target_sr: int,
+              quality: str = "polyphase"):
+    """
+    ``resample`` cached per (fingerprint of ``y``, target_sr, quality), so
+    switching back to a rate seen before costs nothing.
+    """
+    instrument.mark_miss()
+    return derive(y, resample(y, orig_sr, target_sr, quality), "resample",
+                  target_sr, quality)
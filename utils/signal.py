@@ -0,0 +1,70 @@
+import hashlib
+
+import numpy as np
+
+
+def digest(*parts) -> str:
+    return hashlib.blake2b(
+        repr(parts).encode(), digest_size=16).hexdigest()
+
+
+class Signal(np.ndarray):
+    """
+    Audio samples together with a content key.
+
+    The key is set once where the samples come from (decoding, or a
+    transform of another keyed signal) and lets cached functions key on
+    it instead of hashing the samples. Arrays derived from a Signal by
+    numpy operations or slicing lose the key, since their samples differ.
+    """
+
+    def __new__(cls, data, key: str):
+        obj = np.asarray(data).view(cls)
+        obj.key = key
+        return obj
+
+    def __array_finalize__(self, obj):
+        self.key = None
+
+
+def fingerprint(y: np.ndarray) -> str:
+    key = getattr(y, "key", None)
+    if key is not None:
+        return key
+    y = np.ascontiguousarray(y)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{y.dtype.str}{y.shape}".encode())
+    h.update(y.data)
+    return h.hexdigest()
+
+
+def as_float32(y: np.ndarray) -> np.ndarray:
+    """
+    ``y`` as float32, the dtype signals are kept in throughout the app. No
+    copy is made if it already is.
+    """
+    return y if y.dtype == np.float32 else y.astype(np.float32)
+
+
+def peak_abs(y: np.ndarray):
+    """
+    ``np.abs(y).max()`` (0 for an empty signal) without allocating the
+    full-length copy that ``np.abs`` makes.
+    """
+    if len(y) == 0:
+        return y.dtype.type(0)
+    return max(y.max(), -y.min())
+
+
+def derive(parent: np.ndarray, data: np.ndarray, *parts) -> Signal:
+    """
+    Wrap ``data``, computed from ``parent`` by the operation described by
+    ``parts``, into a Signal keyed on the parent's key and ``parts``.
+    """
+    if isinstance(data, Signal) and data.key is not None:
+        return data
+    return Signal(data, digest(fingerprint(parent), *parts))
+
+
+# hash_funcs for st.cache so that keyed signals hash by key
+HASH_FUNCS = {Signal: fingerprint}